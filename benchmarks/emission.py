@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+#
+# Writing build.ninja: time and memory of the emission after binding.
+#
+#   PYTHONPATH=src python3 benchmarks/emission.py [-n repeats] [--objects N]
+#
+# A synthetic project: every object is compiled from a source including
+# headers of its directory, the headers include each other in chains, and
+# a library per directory collects its objects.
+
+import argparse
+import io
+import time
+import tracemalloc
+
+from jamp.build import ninja_build
+from jamp.classes import State
+from jamp.executors import bind_targets, run
+
+
+def synthetic_project(objects: int, per_dir=100, headers=20) -> str:
+    parts = [
+        "actions Cc { cc -c $(>) -o $(<) }\n",
+        "actions Archive { ar ru $(<) $(>) }\n",
+        "NotFile all _gen_headers ;\n",
+    ]
+
+    for d in range(0, objects // per_dir):
+        parts.append(f"Depends all : lib{d}.a ;\n")
+        for h in range(1, headers):
+            parts.append(f"Includes d{d}/h{h}.h : d{d}/h{h - 1}.h ;\n")
+
+        objs = []
+        for i in range(per_dir):
+            obj, src = f"d{d}/o{i}.o", f"d{d}/s{i}.c"
+            objs.append(obj)
+            parts.append(
+                f"Depends {obj} : {src} ;\n"
+                f"Includes {src} : d{d}/h{i % headers}.h common.h ;\n"
+                f"Cc {obj} : {src} ;\n"
+            )
+
+        parts.append(f"Depends lib{d}.a : {' '.join(objs)} ;\n")
+        parts.append(f"Archive lib{d}.a : {' '.join(objs)} ;\n")
+
+    return "".join(parts)
+
+
+def bound_state(rules: str) -> State:
+    state = State()
+    run(state, state.parse_and_compile(rules))
+    bind_targets(state, search_headers="none")
+    return state
+
+
+def main():
+    parser = argparse.ArgumentParser(description="jamp emission benchmark")
+    parser.add_argument("-n", "--repeats", type=int, default=3)
+    parser.add_argument("--objects", type=int, default=20000)
+    args = parser.parse_args()
+
+    rules = synthetic_project(args.objects)
+
+    best = None
+    for _ in range(args.repeats):
+        state = bound_state(rules)
+        started = time.perf_counter()
+        ninja_build(state, io.StringIO())
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+
+    state = bound_state(rules)
+    tracemalloc.start()
+    ninja_build(state, io.StringIO())
+    kept, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f"{len(state.targets)} targets:")
+    print(f"  emission  {best * 1000:9.1f} ms")
+    print(f"  memory    {peak / 2**20:9.1f} MB peak, {kept / 2**20:.1f} MB kept")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+#
+# Evaluation speed: the closure backend against the Exec tree (--trace).
+#
+#   PYTHONPATH=src python3 benchmarks/execute.py [-n repeats]
+#
+# Evaluates Jambase (without including a Jamfile) followed by a synthetic
+# project that calls Jambase rules and loops over lists.
+
+import argparse
+import os
+import sys
+import time
+
+from jamp.classes import State
+from jamp.compile import compile, compile_block
+from jamp.executors import run
+from jamp.jam_syntax import parse
+from jamp.snapshot import split_jambase
+
+JAMBASE = os.path.join(os.path.dirname(__file__), "..", "src", "jamp", "Jambase")
+
+
+def synthetic_jamfile(subdirs=200):
+    parts = []
+    for i in range(subdirs):
+        parts.append(
+            f"SEARCH_SOURCE = src/d{i} ;\n"
+            f"SOURCES = a{i}.c b{i}.c c{i}.cpp d{i}.y ;\n"
+            "for f in $(SOURCES) {\n"
+            "    switch $(f:S) {\n"
+            "        case .c : C += $(f) ;\n"
+            "        case .cpp : CPP += $(f) ;\n"
+            "        case * : OTHER += $(f) ;\n"
+            "    }\n"
+            "    if $(f:S) = .c && ! $(NOCC) { Objects $(f) ; }\n"
+            "}\n"
+            f"LINKLIBS on libd{i}$(SUFLIB) += [ FDirName lib d{i} ] ;\n"
+        )
+
+    return "".join(parts)
+
+
+def evaluate(ast, tree):
+    state = State()
+    run(state, compile(state, ast) if tree else compile_block(state, ast))
+
+
+def measure(ast, tree, repeats):
+    best = None
+    for _ in range(repeats):
+        started = time.perf_counter()
+        evaluate(ast, tree)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="jamp evaluation benchmark")
+    parser.add_argument("-n", "--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    with open(JAMBASE) as f:
+        base, _ = split_jambase(parse(f.read()))
+
+    # Echo and friends should not print anything
+    sys._called_from_test = True
+
+    for name, ast in (
+        ("Jambase", base),
+        ("Jambase + synthetic", base + parse(synthetic_jamfile())),
+    ):
+        tree = measure(ast, True, args.repeats)
+        closures = measure(ast, False, args.repeats)
+        print(f"{name}:")
+        print(f"  Exec tree {tree * 1000:9.1f} ms")
+        print(f"  closures  {closures * 1000:9.1f} ms")
+        print(f"  speedup: {tree / closures:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
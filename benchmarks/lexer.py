@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+#
+# Lexer throughput: the regex based Lexer against the original CharLexer.
+#
+#   PYTHONPATH=src python3 benchmarks/lexer.py [-n repeats] [files...]
+#
+# Without files it uses Jambase and a synthetic Jamfile with long action blocks.
+
+import argparse
+import os
+import time
+
+from jamp.jam_lexer import CharLexer, Lexer
+
+JAMBASE = os.path.join(os.path.dirname(__file__), "..", "src", "jamp", "Jambase")
+
+
+def synthetic_jamfile(rules=2000, action_lines=40):
+    parts = []
+    for i in range(rules):
+        parts.append(
+            f"rule R{i} {{\n"
+            f'    local x = $(<:S=.o) "quoted {i}" \\\\escaped ;\n'
+            f"    DEPENDS $(<) : $(>) ; # comment {i}\n"
+            f"    if $(x) = a || ! $(y) in b c {{ R{i} $(x) : y ; }}\n"
+            "}\n"
+        )
+        parts.append(f"actions R{i} {{\n")
+        for j in range(action_lines):
+            parts.append(
+                f"    $(CC) -c -o $(<) $(CCFLAGS) -I$(HDRS) $(>) # {j} {{ }}\n"
+            )
+        parts.append("}\n")
+
+    return "".join(parts)
+
+
+def run(lexer_cls, text):
+    lexer = lexer_cls()
+    lexer.input(text)
+    count = 0
+    while lexer.token():
+        count += 1
+
+    return count
+
+
+def measure(lexer_cls, text, repeats):
+    best = None
+    for _ in range(repeats):
+        started = time.perf_counter()
+        count = run(lexer_cls, text)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+
+    return count, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="jamp lexer benchmark")
+    parser.add_argument("-n", "--repeats", type=int, default=5)
+    parser.add_argument("files", nargs="*")
+    args = parser.parse_args()
+
+    inputs = []
+    for fn in args.files or [JAMBASE]:
+        with open(fn) as f:
+            inputs.append((os.path.basename(fn), f.read()))
+
+    if not args.files:
+        inputs.append(("synthetic", synthetic_jamfile()))
+
+    for name, text in inputs:
+        mb = len(text) / 1024 / 1024
+        print(f"{name}: {len(text)} bytes")
+        results = {}
+        for lexer_cls in (CharLexer, Lexer):
+            count, best = measure(lexer_cls, text, args.repeats)
+            results[lexer_cls] = best
+            print(
+                f"  {lexer_cls.__name__:10} {count:8} tokens "
+                f"{best * 1000:9.1f} ms {mb / best:7.2f} MB/s"
+            )
+
+        print(f"  speedup: {results[CharLexer] / results[Lexer]:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
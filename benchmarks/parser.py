@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+#
+# Parser throughput: the recursive-descent Parser against the PLY LALR parser.
+#
+#   PYTHONPATH=src python3 benchmarks/parser.py [-n repeats] [files...]
+#
+# Without files it uses Jambase and a synthetic Jamfile tree concatenated
+# into one text.
+
+import argparse
+import os
+import time
+
+from jamp.jam_lexer import Lexer
+from jamp.jam_syntax import Parser, get_parser
+
+JAMBASE = os.path.join(os.path.dirname(__file__), "..", "src", "jamp", "Jambase")
+
+
+def synthetic_jamfiles(subdirs=500):
+    parts = []
+    for i in range(subdirs):
+        parts.append(
+            f"SubDir TOP src d{i} ;\n"
+            f"SOURCES = a{i}.c b{i}.c [ FGristFiles c{i}.c ] ;\n"
+            f"if $(UNIX) && ! $(NOARSCAN) || $(i) in a b c {{\n"
+            f"    Library libd{i} : $(SOURCES) ;\n"
+            "} else {\n"
+            f"    HDRS on $(SOURCES) += $(SUBDIR) [ on x return $(HDRS) ] ;\n"
+            "}\n"
+            "switch $(OS) {\n"
+            "    case NT* : LINKLIBS += ws2_32.lib ;\n"
+            "    case * : LINKLIBS += -lm ;\n"
+            "}\n"
+            f"for f in $(SOURCES) {{ Echo $(f:S=.o) : {i} ; }}\n"
+        )
+
+    return "".join(parts)
+
+
+def run_ply(text):
+    lexer = Lexer()
+    lexer.input(text)
+    return get_parser().parse(lexer=lexer)
+
+
+def run_rd(text):
+    lexer = Lexer()
+    lexer.input(text)
+    return Parser(lexer).parse()
+
+
+def run_lexer(text):
+    lexer = Lexer()
+    lexer.input(text)
+    while lexer.token():
+        pass
+
+
+def measure(func, text, repeats):
+    best = None
+    for _ in range(repeats):
+        started = time.perf_counter()
+        func(text)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="jamp parser benchmark")
+    parser.add_argument("-n", "--repeats", type=int, default=5)
+    parser.add_argument("files", nargs="*")
+    args = parser.parse_args()
+
+    inputs = []
+    for fn in args.files or [JAMBASE]:
+        with open(fn) as f:
+            inputs.append((os.path.basename(fn), f.read()))
+
+    if not args.files:
+        inputs.append(("synthetic", synthetic_jamfiles()))
+
+    # build (or load) the tables outside of measurements
+    get_parser()
+
+    for name, text in inputs:
+        print(f"{name}: {len(text)} bytes")
+        lex = measure(run_lexer, text, args.repeats)
+        ply = measure(run_ply, text, args.repeats)
+        rd = measure(run_rd, text, args.repeats)
+        print(f"  lexing  {lex * 1000:9.1f} ms")
+        print(f"  PLY     {ply * 1000:9.1f} ms")
+        print(f"  Parser  {rd * 1000:9.1f} ms")
+        print(
+            f"  speedup: {ply / rd:.1f}x, without lexing: {(ply - lex) / (rd - lex):.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
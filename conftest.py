@@ -1,3 +1,7 @@
+import os
+import shutil
+import tempfile
+
 import pytest
 
 
@@ -6,6 +10,9 @@ def pytest_configure(config):
 
     sys._called_from_test = True
 
+    # keep persistent caches of the test runs away from the user's cache
+    os.environ["JAMP_CACHE_DIR"] = tempfile.mkdtemp(prefix="jamp-cache-")
+
 
 def pytest_unconfigure(config):
     import sys
@@ -13,6 +20,8 @@ def pytest_unconfigure(config):
     if hasattr(sys, "_called_from_test"):
         delattr(sys, "_called_from_test")
 
+    shutil.rmtree(os.environ.pop("JAMP_CACHE_DIR", ""), ignore_errors=True)
+
 
 @pytest.fixture(autouse=True)
 def run_around_tests():
@@ -4,9 +4,15 @@ import subprocess as sp
 import sys
 from collections import OrderedDict
 
-from jamp import __version__, executors, headers, jam_builtins
+from jamp import __version__, executors, headers, jam_builtins, snapshot
 from jamp.classes import State, Target, UpdatingAction
-from jamp.paths import add_paths, check_vms, check_windows, escape_path
+from jamp.compile import compile_block
+from jamp.graph import DIRS_TARGET, NOTFILE, TargetGraph
+from jamp.jam_syntax import parse_cached
+from jamp.paths import check_vms, check_windows, escape_path
+from jamp.rule_memo import rule_memo_stats
+
+PARTIAL_MANIFEST = "# jamp: partial manifest for"
 
 windows_common_cmds = ["cl", "cl.exe", "cp", "copy"]
 windows_oneliners = [" & ", " && ", " | ", " || ", "^T"]
@@ -17,7 +23,9 @@ def parse_args(skip_args=False):
         prog="jamp",
         description="Jam Build System (Python version)",
     )
-    parser.add_argument("--version", action="version", version=f"%(prog)s {__version__}")
+    parser.add_argument(
+        "--version", action="version", version=f"%(prog)s {__version__}"
+    )
     parser.add_argument("-b", "--build", action="store_true", help="call ninja")
     parser.add_argument("-v", "--verbose", action="store_true", help="verbose output")
     parser.add_argument("--profile", action="store_true", help="profile the execution")
@@ -57,12 +65,37 @@ def parse_args(skip_args=False):
         ),
         nargs="+",
     )
+    parser.add_argument(
+        "--stat-jobs",
+        type=int,
+        default=8,
+        help="threads reading directories before binding, 0 to disable (default 8)",
+    )
     parser.add_argument(
         "-f", "--jamfile", default="Jamfile", help="--specify jam file name"
     )
     parser.add_argument(
         "-e", "--env", action="append", help="--specify extra env variables"
     )
+    parser.add_argument(
+        "--only",
+        default=[],
+        nargs="+",
+        metavar="TARGET_OR_DIR",
+        help=(
+            "write a partial build.ninja for the targets, or the targets built "
+            "in or from the directories, with everything they need. A selector "
+            "ending with / or naming an existing directory is a directory"
+        ),
+    )
+    parser.add_argument(
+        "targets",
+        nargs="*",
+        help=(
+            "targets to write to build.ninja with everything they need "
+            "(default is all pseudo-targets like all, install, clean)"
+        ),
+    )
     args = parser.parse_args(args=[] if skip_args else None)
     return args
 
@@ -111,50 +144,95 @@ def main_app(args):
     if args.verbose:
         print("...parsing jam files...")
 
-    cmds = state.parse_and_compile(jambase_contents)
+    base, tail = snapshot.split_jambase(parse_cached(jambase_contents, jambase))
+    snapshot_fn = snapshot.snapshot_file(jambase_contents)
 
     if args.verbose:
         print("...execution...")
 
     try:
-        executors.run(state, cmds)
+        if not snapshot.restore(state, snapshot_fn):
+            snapshot.run_and_save(state, base, snapshot_fn)
+
+        executors.run(state, compile_block(state, tail))
     except:
         jam_builtins.Builtins.backtrace()
         raise
 
     if args.verbose:
+        print(f"...{state.vars.memo_stats()}, {rule_memo_stats(state)}...")
         print("...binding targets and searching headers...")
 
     if not args.no_headers_cache:
         headers.load_headers_cache()
 
-    executors.bind_targets(state, search_headers=args.search_type)
+    roots = args.targets
+    scope = None
+    if args.only:
+        scope = " ".join(args.only)
+        roots = roots + executors.select_roots(state, args.only)
+        if not roots:
+            print("jamp: nothing to write")
+            sys.exit(1)
+
+    executors.bind_targets(
+        state,
+        search_headers=args.search_type,
+        stat_jobs=args.stat_jobs,
+        roots=roots,
+    )
 
     if not args.no_headers_cache:
         headers.save_headers_cache()
 
     all_target = Target.bind(state, "all")
-    all_target.search_for_cycles(verbose=args.verbose)
-
     state.finish_steps()
 
+    graph = TargetGraph(state)
+    graph.remove_cycles([all_target], verbose=args.verbose)
+
     print(f"...found {len(state.targets)} target(s)...")
     if args.verbose:
         print("...writing build.ninja...")
 
+    previous = manifest_scope("build.ninja")
+    if previous is not None and previous != scope:
+        print(f"...replacing partial build.ninja for {previous}...")
+
     with open("build.ninja", "w") as f:
-        ninja_build(state, f)
+        ninja_build(state, f, roots=roots, scope=scope, graph=graph)
 
     if args.build:
         sp.run(["ninja"], check=False)
 
 
-def ninja_build(state: State, output):
+def manifest_scope(fn: str) -> str | None:
+    """The scope of a partial manifest written with --only"""
+
+    try:
+        with open(fn) as f:
+            line = f.readline()
+    except OSError:
+        return None
+
+    if line.startswith(PARTIAL_MANIFEST):
+        return line[len(PARTIAL_MANIFEST) :].strip()
+
+
+def ninja_build(state: State, output, roots=None, scope=None, graph=None):
     """Write ninja.build"""
 
     from jamp.ninja_syntax import Writer
 
+    if graph is None:
+        graph = TargetGraph(state)
+
     writer = Writer(output, width=120)
+    if scope is not None:
+        # a full run replaces it
+        output.write(f"{PARTIAL_MANIFEST} {scope}\n")
+        writer.newline()
+
     if check_windows():
         writer.variable("ninja_required_version", "1.14")
         writer.newline()
@@ -162,7 +240,14 @@ def ninja_build(state: State, output):
     counter = 0
     commands_cache = {}
 
-    for step in state.build_steps:
+    unreachable = state.unreachable
+    build_steps = [
+        step
+        for step in state.build_steps
+        if not unreachable or not all(target in unreachable for target in step[0])
+    ]
+
+    for step in build_steps:
         upd_action: UpdatingAction = step[1]
         upd_action.name = f"{upd_action.action.name}{counter}".replace("+", "_")
         counter += 1
@@ -265,38 +350,39 @@ def ninja_build(state: State, output):
         if dep.boundname:
             gen_headers[dep.boundname] = None
 
-    for target in state.targets.values():
-        implicit, order_only = target.get_dependency_list(state)
-        implicit = {escape_path(i) for i in implicit}
-        order_only = {escape_path(i) for i in order_only}
+    for i, target in enumerate(graph.targets):
+        if unreachable and target in unreachable:
+            continue
 
-        if target.notfile:
+        implicit, order_only = graph.dependencies(i)
+
+        flags = graph.flags[i]
+        if flags & NOTFILE:
             kwargs = {}
-            if target.is_dirs_target:
-                kwargs["order_only"] = implicit | order_only
+            if flags & DIRS_TARGET:
+                kwargs["order_only"] = graph.names({*implicit, *order_only})
             else:
-                kwargs["order_only"] = order_only
-                kwargs["implicit"] = implicit
+                kwargs["order_only"] = graph.names(order_only)
+                kwargs["implicit"] = graph.names(implicit)
 
             writer.build(target.name, "phony", **kwargs)
             phonies[target.name] = True
 
-    for target in state.targets.values():
-        if target.collection is not None:
+    for i, target in enumerate(graph.targets):
+        if graph.collections[i] >= 0:
             if target.collection_name() in phonies:
                 continue
 
-            implicit_deps = (escape_path(i) for i in target.collection[0])
-            order_only_deps = (escape_path(i) for i in target.collection[1])
+            implicit, order_only = graph.collection(i)
             writer.build(
                 target.collection_name(),
                 "phony",
-                implicit=implicit_deps,
-                order_only=order_only_deps,
+                implicit=graph.names(implicit),
+                order_only=graph.names(order_only),
             )
             phonies[target.collection_name()] = True
 
-    for stepnum, step in enumerate(state.build_steps):
+    for stepnum, step in enumerate(build_steps):
         outputs = OrderedDict()
         targets, upd_action = step
 
@@ -309,36 +395,40 @@ def ninja_build(state: State, output):
         if len(outputs) == 0:
             continue
 
-        all_implicit = set()
-        all_order_only = set()
-
-        for target in targets:
-            implicit, order_only = target.get_dependency_list(state, outputs=outputs)
-            add_paths(all_implicit, implicit)
-            add_paths(all_order_only, order_only)
+        output_ids = {graph.intern(path) for path in outputs}
+        if len(targets) == 1:
+            implicit_ids, order_only_ids = graph.dependencies(
+                targets[0].id, outputs=output_ids
+            )
+        else:
+            implicit_ids, order_only_ids = set(), set()
+            for target in targets:
+                implicit, order_only = graph.dependencies(target.id, outputs=output_ids)
+                implicit_ids.update(implicit)
+                order_only_ids.update(order_only)
 
         inputs = OrderedDict()
 
         for source in upd_action.sources:
             inputs[escape_path(source.boundname or source.name)] = None
 
-        res_implicit = set()
-        res_order_only = set()
+        res_implicit = {}
+        res_order_only = {}
 
-        for dep in all_implicit:
+        for dep in graph.path_list(implicit_ids):
             if dep in inputs:
                 continue
 
             if dep in gen_headers:
-                res_order_only.add(dep)
+                res_order_only[dep] = None
             else:
-                res_implicit.add(dep)
+                res_implicit[dep] = None
 
-        for dep in all_order_only:
+        for dep in graph.path_list(order_only_ids):
             if dep in inputs:
                 continue
 
-            res_order_only.add(dep)
+            res_order_only[dep] = None
 
         variables = None
 
@@ -354,7 +444,19 @@ def ninja_build(state: State, output):
             variables=variables,
         )
 
-    writer.default("all")
+    all_target = state.targets.get("all")
+    if roots and (all_target is None or all_target in unreachable):
+        defaults = []
+        for name in roots:
+            target = state.targets.get(name)
+            if target is not None and (target.notfile or target.build_step):
+                defaults.append(target.name if target.notfile else target.boundname)
+
+        defaults = [escape_path(path) for path in dict.fromkeys(defaults) if path]
+        if defaults:
+            writer.default(defaults)
+    else:
+        writer.default("all")
 
 
 def main_cli(skip_args=False):
@@ -0,0 +1,74 @@
+#
+# cache.py - location of persistent caches shared between jamp runs
+#
+# JAMP_CACHE_DIR overrides the location, an empty value disables caching.
+# Otherwise $XDG_CACHE_HOME/jamp or ~/.cache/jamp is used.
+#
+
+import os
+import pickle
+
+CACHE_DIR_ENV = "JAMP_CACHE_DIR"
+
+
+def cache_dir() -> str | None:
+    """Returns the cache directory (created if needed) or None if it's not usable"""
+
+    path = os.environ.get(CACHE_DIR_ENV)
+    if path is None:
+        base = os.environ.get("XDG_CACHE_HOME") or os.path.join(
+            os.path.expanduser("~"), ".cache"
+        )
+        path = os.path.join(base, "jamp")
+
+    if not path:
+        return None
+
+    try:
+        os.makedirs(path, exist_ok=True)
+    except OSError:
+        return None
+
+    if not os.access(path, os.W_OK):
+        return None
+
+    return path
+
+
+def cache_file(name: str) -> str | None:
+    path = cache_dir()
+    if path is None:
+        return None
+
+    return os.path.join(path, name)
+
+
+def load_pickle(path: str | None):
+    """Returns None if there is no usable data in the file"""
+
+    if path is None:
+        return None
+
+    try:
+        with open(path, "rb") as f:
+            return pickle.load(f)
+    except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ValueError):
+        return None
+
+
+def save_pickle(path: str | None, data) -> bool:
+    if path is None:
+        return False
+
+    # several jamp processes could write the same file, so replace it atomically
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            pickle.dump(data, f, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+    except (OSError, pickle.PicklingError, RecursionError):
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        return False
+
+    return True
@@ -1,12 +1,20 @@
-import graphlib
 import os
+import pickle
 from typing import ClassVar, Optional
 
+from jamp.dirindex import DirIndex, run_parallel, split_dir, stat_or_none
 from jamp.headers import skip_include, target_find_headers
-from jamp.paths import Pathname, check_vms, check_windows
+from jamp.paths import Pathname, check_vms, check_windows, join_posix
 
 PATH_VARS = {"PATH", "LD_LIBRARY_PATH", "PKG_CONFIG_PATH", "CLASSPATH", "PYTHONPATH"}
 
+# marks a local variable that shadows nothing
+UNBOUND = object()
+
+
+# variables of targets without them, the table is shared and never changed
+EMPTY_VARS = {}
+
 
 def is_subdir(path: str, potential_subdir: str):
     # Normalize paths to handle different path structures
@@ -58,6 +66,17 @@ class State:
         self.targets = {}
         self.current_rule = None
         self.params = None
+
+        # Resolved rule calls by name, see executors.rule_dispatcher()
+        self.rule_dispatch = {}
+
+        # Pure rules by name, rules named by Memoize and memoized calls,
+        # see rule_memo.py
+        self.pure_rules = {}
+        self.memoized_rules = set()
+        self.rule_memo = {}
+        self.rule_memo_hits = 0
+        self.rule_memo_misses = 0
         self.always_build = set()
         self.build_steps = []
         self.debug_headers = debug_headers
@@ -70,27 +89,87 @@ class State:
         # Reverse location->target map.
         self.target_locations = {}
 
+        # Targets not needed for the requested ones, see bind_targets()
+        self.unreachable = set()
+
         # Files are only inspected while generating build.ninja, before Ninja
         # can create or remove outputs. Cache both successful and failed stats
         # to avoid repeated filesystem lookups (particularly expensive on VMS).
         self.file_stats: dict[str, os.stat_result | None] = {}
 
+        # Directory listings, existence checks are lookups in them
+        self.dir_index = DirIndex()
+
         # Header-name macros registered by the HdrMacro builtin.
         self.header_macros = {}
 
         # skipped from scanning headers, just a cache
         self.scan_skipped = set()
 
+        # `on target` blocks being executed, see UnderTarget
+        self.overlays = []
+
+        # Counts operations with results or effects outside of the state
+        # (file access, commands, output), a state snapshot can't repeat them.
+        self.side_effects = 0
+
+    def rules_changed(self, name: str | None = None):
+        """Forgets resolved and memoized calls before the rule is (re)defined"""
+
+        if name is not None and name not in self.rules and name not in self.pure_rules:
+            # nothing could call it yet
+            self.rule_dispatch.pop(name, None)
+            return
+
+        self.rule_dispatch.clear()
+        self.pure_rules.clear()
+        self.rule_memo.clear()
+
     def file_stat(self, path: str) -> os.stat_result | None:
         if path not in self.file_stats:
+            self.side_effects += 1
+            if self.dir_index.exists(path) is False:
+                self.file_stats[path] = None
+                return None
+
             try:
                 self.file_stats[path] = os.stat(path)
             except OSError:
                 self.file_stats[path] = None
         return self.file_stats[path]
 
+    def prefetch_stats(self, paths, jobs: int) -> float:
+        """Stats the paths in parallel, returns the time the calls took"""
+
+        paths = [path for path in set(paths) if path not in self.file_stats]
+        if paths:
+            self.side_effects += 1
+
+        results, busy = run_parallel(stat_or_none, paths, jobs)
+        self.file_stats.update(zip(paths, results))
+        return busy
+
+    def files_changed(self):
+        """Forgets listings and missing files, a command could create them"""
+
+        self.dir_index = DirIndex()
+        self.file_stats = {
+            path: stat for path, stat in self.file_stats.items() if stat is not None
+        }
+
     def file_exists(self, path: str) -> bool:
-        return self.file_stat(path) is not None
+        if path in self.file_stats:
+            return self.file_stats[path] is not None
+
+        self.side_effects += 1
+        exists = self.dir_index.exists(path)
+        if exists is None:
+            return self.file_stat(path) is not None
+
+        if not exists:
+            self.file_stats[path] = None
+
+        return exists
 
     def sub_root(self):
         sub_root = self.vars.get("SUBDIR_ROOT")
@@ -103,11 +182,11 @@ class State:
         return sub_root
 
     def parse_and_compile(self, contents: str, filename=None):
-        from jamp.compile import compile
-        from jamp.jam_syntax import parse
+        from jamp.compile import compile_block
+        from jamp.jam_syntax import parse_cached
 
-        ast = parse(contents, filename=filename)
-        cmds = compile(self, ast)
+        ast = parse_cached(contents, filename=filename)
+        cmds = compile_block(self, ast)
         return cmds
 
     def get_target(self, name):
@@ -155,14 +234,35 @@ class Vars:
 
     def __init__(self, debug_env=False):
         self.debug_env = debug_env
-        self.scopes = []
-        self.scope = {}
-        self.global_scope = self.scope
+
+        # Shallow binding: `values` always has the innermost binding of every
+        # variable, so lookups don't walk the scopes. `local` saves the
+        # shadowed value to `saved`, and pop() restores values saved after
+        # the matching push() mark.
+        self.values = {}
+        self.saved = []
+        self.marks = []
         self.set_basic_vars()
 
         # setting current targets will force to using target variables
         self.current_context = []
 
+        # names of read variables are collected here if it's a set
+        self.reads = None
+
+        # Every write gives the variable a new version from the clock,
+        # expansions are memoized by the versions of variables they read,
+        # see VarTemplate.expand().
+        self.clock = 0
+        self.versions = {}
+        self.memo = {}
+        self.memo_hits = 0
+        self.memo_misses = 0
+
+        # Lists made by append() that are not given out, `+=` extends them
+        # in place. get() and global_scope give the lists out.
+        self.owned = {}
+
     def split_path(self, val):
         return val.split(os.path.pathsep)
 
@@ -173,43 +273,60 @@ class Vars:
         if check_windows():
             import nt
 
-            self.scope.update(nt.environ.copy())
+            self.values.update(nt.environ.copy())
         else:
-            self.scope.update(os.environ.copy())
+            self.values.update(os.environ.copy())
 
         for v in self.delete_vars:
-            if v in self.scope:
-                del self.scope[v]
+            if v in self.values:
+                del self.values[v]
 
         match platform.system():
             case "Linux" | "Solaris" | "AIX" | "Darwin":
-                self.scope["UNIX"] = "1"
+                self.values["UNIX"] = "1"
             case "OpenVMS":
-                self.scope["VMS"] = "1"
+                self.values["VMS"] = "1"
             case "Windows":
-                self.scope["NT"] = "1"
+                self.values["NT"] = "1"
 
-        self.scope["OSPLAT"] = platform.machine()
-        self.scope["OS"] = platform.system().upper()
+        self.values["OSPLAT"] = platform.machine()
+        self.values["OS"] = platform.system().upper()
 
         # same as in original jam
         if platform.system() == "Darwin":
-            self.scope["OS"] = "MACOSX"
+            self.values["OS"] = "MACOSX"
 
-        self.scope["JAMUNAME"] = platform.uname()
-        self.scope["JAMVERSION"] = "2.6.1"
-        self.scope["JAMCOUNTER"] = "<NINJA_SIGIL>step"
+        self.values["JAMUNAME"] = platform.uname()
+        self.values["JAMVERSION"] = "2.6.1"
+        self.values["JAMCOUNTER"] = "<NINJA_SIGIL>step"
 
-        for k, v in self.scope.items():
+        for k, v in self.values.items():
             if k in PATH_VARS:
-                self.scope[k] = self.split_path(v)
+                self.values[k] = self.split_path(v)
 
         if self.debug_env:
-            for key, val in self.scope.items():
+            for key, val in self.values.items():
                 print(f"{key}={val}")
 
     def __repr__(self):
-        return f"current scope: {self.scope}\nscopes: {self.scopes}"
+        return f"values: {self.values}\nsaved: {self.saved}"
+
+    @property
+    def global_scope(self) -> dict:
+        """Global variables, a copy if some of them are shadowed by locals"""
+
+        self.owned.clear()
+        if not self.saved:
+            return self.values
+
+        res = dict(self.values)
+        for name, old in reversed(self.saved):
+            if old is UNBOUND:
+                res.pop(name, None)
+            else:
+                res[name] = old
+
+        return res
 
     def set(self, name: str, value: str | None):
         if not isinstance(name, str):
@@ -221,48 +338,36 @@ class Vars:
         if isinstance(value, list) and len(value) and isinstance(value[0], list):
             raise ValueError(f"can't store LOL as value for {name}: got {value}")
 
-        if name in self.scope:
-            # something local
-            self.scope[name] = value
-        else:
-            # check in upper levels
-            for level in reversed(self.scopes):
-                if name in level:
-                    level[name] = value
-                    return
+        # the innermost binding, local or global
+        self.values[name] = value
+        self.touch(name)
 
-            # not defined, goes to global
-            self.global_scope[name] = value
+    def touch(self, name: str):
+        """Marks the variable as changed"""
 
-    def get_scope(self, name: str):
-        if not isinstance(name, str):
-            raise TypeError(
-                f"vars_get_scope: expected str value for key name: got {name}"
-            )
+        self.clock += 1
+        self.versions[name] = self.clock
 
-        res_scope = None
+    def memo_stats(self) -> str:
+        total = self.memo_hits + self.memo_misses
+        rate = self.memo_hits * 100 / total if total else 0
+        return f"{total} expansion(s) memoized, {rate:.1f}% hits"
 
-        if name in self.scope:
-            # something local
-            res_scope = self.scope
-        else:
-            # check in upper levels
-            for level in reversed(self.scopes):
-                if name in level:
-                    res_scope = level
-                    break
+    def is_set(self, name: str) -> bool:
+        """True if the variable has a non-empty value (target variables are ignored)"""
+
+        if not isinstance(name, str):
+            raise TypeError(f"vars_is_set: expected str value for key name: got {name}")
 
-            # not defined, check global
-            if res_scope is None and name in self.global_scope:
-                return self.global_scope
+        if self.reads is not None:
+            self.reads.add(name)
 
-        # probably value in symbols, but not read, so read it and set in the current scope
-        if res_scope is None:
+        value = self.values.get(name)
+        if value is None:
+            # probably value in symbols, but not read yet
             value = self.check_vms_symbol(name)
-            if value is not None:
-                res_scope = self.global_scope
 
-        return res_scope
+        return bool(value)
 
     def check_vms_symbol(self, name):
         if check_vms():
@@ -270,7 +375,9 @@ class Vars:
 
             status, val = vms.lib.get_symbol(name)
             if status == 1:
-                self.global_scope[name] = [val]
+                # not bound anywhere, so it goes to globals
+                self.values[name] = [val]
+                self.touch(name)
                 if self.debug_env:
                     print(f"{name}={val}")
 
@@ -278,59 +385,132 @@ class Vars:
 
     def set_local(self, name: str, value: str | None):
         value = value if value is not None else []
-        self.scope[name] = value
+
+        if self.marks:
+            saved = self.saved
+            for i in range(self.marks[-1], len(saved)):
+                if saved[i][0] == name:
+                    break
+            else:
+                saved.append((name, self.values.get(name, UNBOUND)))
+
+        self.values[name] = value
+        self.touch(name)
 
     def get(self, name: str, on_target=None):
+        res = self.lookup(name, on_target)
+        if res and self.owned.get(name) is res:
+            del self.owned[name]
+
+        return res
+
+    def lookup(self, name: str, on_target=None):
+        """Same as get() but the result can't be kept, used for expansion"""
+
         if not isinstance(name, str):
             raise TypeError(f"vars_get: expected str value for key name: got {name}")
 
-        if on_target:
-            self.current_context.append(on_target.vars)
+        if self.reads is not None:
+            self.reads.add(name)
 
         res = None
-        if self.current_context:
+        if on_target and name in on_target.vars:
+            res = on_target.vars[name]
+
+        if res is None and self.current_context:
             for ctx in reversed(self.current_context):
                 if name in ctx:
                     res = ctx.get(name)
                     break
 
-        if on_target:
-            self.current_context.pop()
-
         if res is None:
-            if name in self.scope:
-                res = self.scope.get(name)
-            else:
-                for level in reversed(self.scopes):
-                    if name in level:
-                        res = level.get(name)
-                        break
+            res = self.values.get(name)
 
-        if res is None:
-            val = self.check_vms_symbol(name)
-            if val is not None:
-                return val
+            if res is None:
+                val = self.check_vms_symbol(name)
+                if val is not None:
+                    return val
 
         return res if res else []
 
+    def append(self, name: str, value: list) -> bool:
+        """`name += value`, returns False if the variable is not set"""
+
+        curval = self.lookup(name)
+        if not curval:
+            return False
+
+        if self.owned.get(name) is curval and self.values.get(name) is curval:
+            curval.extend(value)
+            self.touch(name)
+            return True
+
+        curval = [curval] if isinstance(curval, str) else list(curval)
+        curval.extend(value)
+        self.set(name, curval)
+        self.owned[name] = curval
+        return True
+
     def push(self):
-        self.scopes.append(self.scope)
-        self.scope = {}
+        self.marks.append(len(self.saved))
 
     def pop(self):
-        self.scope = self.scopes.pop()
+        mark = self.marks.pop()
+        saved = self.saved
+        values = self.values
+
+        while len(saved) > mark:
+            name, old = saved.pop()
+            if old is UNBOUND:
+                del values[name]
+            else:
+                values[name] = old
+
+            self.touch(name)
 
 
 class Rule:
-    def __init__(self, name: str, params, commands):
+    def __init__(self, name: str, params, block):
         self.name = name
         self.params = params
-        self.commands = commands
+
+        # Body is compiled on the first call, most of Jambase rules
+        # are never called in a typical project. The AST is pickled then,
+        # it's only needed again for snapshots and purity checks.
+        self.ast = block
+        self.packed = None
+        self.commands = None
+
+        # Python function replacing the rule, see jam_builtins.NATIVE_RULES
+        self.native = None
+
+    @property
+    def block(self):
+        if self.packed is not None:
+            return pickle.loads(self.packed)
+
+        return self.ast
+
+    def compiled(self, state: State):
+        if self.commands is None:
+            from jamp.compile import compile_block
+
+            block = self.block
+            self.commands = compile_block(state, block) or []
+            if self.packed is None:
+                self.packed = pickle.dumps(block, pickle.HIGHEST_PROTOCOL)
+                self.ast = None
+
+        return self.commands
+
+    def __getstate__(self):
+        # compiled commands are not picklable, the body is compiled again
+        return {**self.__dict__, "commands": None}
 
     def execute(self, state: State):
         from jamp.executors import run
 
-        run(state, self.commands)
+        run(state, self.compiled(state))
 
     def __repr__(self):
         return f"Rule {self.name}"
@@ -370,22 +550,66 @@ class Exec:
         return f"F:{self.func.__name__}"
 
 
+def update_vars(table: dict, owned: dict, names: list, assign_type: str, value: list):
+    """Applies `names on target <assign_type> value` to the variables table"""
+
+    for name in names:
+        if assign_type == "=":
+            table[name] = value
+        elif assign_type == "?=":
+            if name not in table:
+                table[name] = value
+        elif assign_type == "+=" and value:
+            # note: skip adding if the value is empty
+            curval = table.get(name)
+            if not curval or curval == [""]:
+                table[name] = value
+            elif owned.get(name) is curval:
+                curval.extend(value)
+            else:
+                curval = [curval] if isinstance(curval, str) else list(curval)
+                curval.extend(value)
+                table[name] = owned[name] = curval
+
+
 class UnderTarget:
     def __init__(self, state: State, target):
         self.state = state
         self.target = target
+        self.context = None
+        self.index = -1
 
     def __enter__(self):
-        self.state.vars.current_context.append(self.target.vars)
+        # the table can be shared, it's replaced on the first assignment to
+        # the target inside, then refresh() puts the new one to the context
+        self.context = self.state.vars.current_context
+        self.index = len(self.context)
+        self.context.append(self.target.vars)
+        self.state.overlays.append(self)
         return self
 
+    def refresh(self):
+        self.context[self.index] = self.target.vars
+
     def __exit__(self, exc_type, exc_value, traceback):
-        self.state.vars.current_context.pop()
+        self.state.overlays.pop()
+        self.context.pop()
         # Do not suppress exceptions (returning True would hide failures
         # during header scanning and leave includes only partially applied).
         return False
 
 
+def is_plain_name(path: Pathname) -> bool:
+    """A POSIX file name without directory, it's looked up in the listings"""
+
+    return (
+        path.directory == "."
+        and bool(path.base)
+        and not path.is_vms
+        and not check_windows()
+    )
+
+
 class Target:
     existing_paths: ClassVar[dict] = {}
 
@@ -395,6 +619,7 @@ class Target:
             return state.targets[name]
 
         target = Target(name, notfile=notfile)
+        target.id = len(state.targets)
         state.targets[name] = target
         return target
 
@@ -412,6 +637,10 @@ class Target:
 
     def __init__(self, name: str, notfile=False):
         self.name: str = name
+
+        # Index in State.targets, the id in the frozen graph (graph.py)
+        self.id = -1
+
         self.depends: set[Target] = set()
         self.includes: set[Target] = set()
         self.boundname: None | str = None
@@ -439,15 +668,13 @@ class Target:
         # Force restat option to ninja
         self.restat = False
 
-        # collection is optimization, if this target is include and it depends on other
-        # files just create a phony target with this target and all others
-        self.collection = None
-
-        # Dependencies cache after get_dependency_list call without outputs
-        self.deps = None
-
-        # Target level variables (ON <target> calls and etc)
-        self.vars = {}
+        # Target level variables (ON <target> calls and etc).
+        # The table can be shared with other targets that got the same
+        # assignments, then it's replaced on change, not modified, see
+        # executors.exec_assign_on_target(). Private tables have
+        # `owned_vars`: lists appended in place, as in Vars.append().
+        self.vars = EMPTY_VARS
+        self.owned_vars = None
 
         # Temporary rule called on this target
         self.temporary = False
@@ -458,9 +685,6 @@ class Target:
         # Found headers
         self.headers = None
 
-        # Circular search
-        self.circular_visited = 0
-
         # NoCare rule
         self.nocare = False
 
@@ -480,114 +704,6 @@ class Target:
     def not_searchable(self):
         return "SEARCH" not in self.vars and "LOCATE" not in self.vars
 
-    def get_dependency_list(self, state: State, level=0, outputs=None):
-        """Ninja level dependency list"""
-
-        implicit, order_only = set(), set()
-        use_cached = outputs is None or len(outputs) == 1
-
-        if level == 10:
-            # do not go too deep for includes
-            return (implicit, order_only)
-
-        if use_cached and self.deps:
-            return self.deps
-
-        for t in self.depends:
-            depval = None
-
-            if t.notfile:
-                if state.unwrap_phony and t.name in state.unwrap_phony:
-                    phony_deps_impl, phony_deps_order = t.get_dependency_list(state)
-                    implicit |= phony_deps_impl
-                    order_only |= phony_deps_order
-                else:
-                    depval = t.name
-            elif t.nocare and t.not_searchable():
-                continue
-            elif t.boundname:
-                if not self.is_dirs_target and t.check_if_dir():
-                    implicit.add("dirs")
-                    continue
-
-                depval = t.boundname
-            elif t.nocare:
-                continue
-
-            if depval:
-                if outputs is not None and depval in outputs:
-                    continue
-                elif t.noupdate:
-                    order_only.add(depval)
-                else:
-                    implicit.add(depval)
-
-        if not self.notfile:
-            for t in self.includes:
-                if use_cached and t.collection is not None:
-                    implicit.add(t.collection_name())
-                    continue
-
-                depval = None
-                if t.notfile:
-                    depval = t.name
-                elif t.boundname and t.boundname in state.target_locations:
-                    depval = t.boundname
-                # elif t.boundname and os.path.isfile(t.boundname):
-                #    depval = t.boundname
-                elif t.nocare:
-                    continue
-
-                if depval is None:
-                    continue
-
-                if outputs and depval in outputs:
-                    continue
-
-                if len(t.depends) or len(t.includes):
-                    inner_deps_impl, inner_deps_order = t.get_dependency_list(
-                        state, level=level + 1, outputs=outputs
-                    )
-
-                    if not use_cached:
-                        implicit |= inner_deps_impl
-                        order_only |= inner_deps_order
-                    elif len(inner_deps_impl) or len(inner_deps_order):
-                        t.collection = (
-                            {depval} | inner_deps_impl,
-                            set(inner_deps_order),
-                        )
-                        depval = t.collection_name()
-
-                if t.noupdate:
-                    order_only.add(depval)
-                else:
-                    implicit.add(depval)
-
-            # collect dependencies from sources which are not built
-            for dep in self.depends:
-                if dep.notfile:
-                    continue
-                elif dep.build_step is None:
-                    built_deps_impl, built_deps_order = dep.get_dependency_list(
-                        state, outputs=outputs
-                    )
-                    implicit |= built_deps_impl
-                    order_only |= built_deps_order
-
-        if state.debug_deps:
-            if state.limit_target is not None:
-                if state.limit_target in self.name:
-                    print(self.name, implicit, order_only)
-            else:
-                print(self.name, implicit, order_only)
-
-        if not use_cached:
-            return (implicit, order_only)
-
-        self.deps = (frozenset(implicit), frozenset(order_only))
-        return self.deps
-
     def find_headers(self, state: State, level=0, db=None):
         if level == 10:
             # do not go too deep in searching
@@ -667,6 +783,13 @@ class Target:
             return res_path
         else:
             search = state.vars.get("SEARCH", on_target=self)
+            if search and is_plain_name(path):
+                res_path = self.search_listings(state, search, path.base + path.suffix)
+                if res_path is not None:
+                    return res_path
+
+                search = ()
+
             for search_dir in search:
                 locate_dir = search_dir
                 path.root = locate_dir
@@ -689,6 +812,98 @@ class Target:
 
         return res_path if not strict else None
 
+    def bound_names(self, state: State) -> list[str]:
+        """
+        Paths search() could bind the target to, found from LOCATE and SEARCH
+        without checking the filesystem
+        """
+
+        if self.boundname:
+            return [self.boundname]
+
+        if self.notfile or not self.name:
+            return []
+
+        path = Pathname()
+        path.parse(self.name)
+        if path.member:
+            return []
+
+        path.grist = ""
+        locate = state.vars.lookup("LOCATE", on_target=self)
+        if locate:
+            path.root = locate[0]
+            return [path.build(binding=True)]
+
+        paths = []
+        for search_dir in state.vars.lookup("SEARCH", on_target=self) or ():
+            path.root = search_dir
+            paths.append(path.build(binding=True))
+
+        path.root = None
+        paths.append(path.build(binding=True))
+        return paths
+
+    def probes(self, state: State, listings: bool) -> list[str]:
+        """
+        Directories (if existence is checked with listings) or paths search()
+        could check, they are prefetched before binding
+        """
+
+        if self.notfile or not self.name or self.boundname:
+            return []
+
+        path = Pathname()
+        path.parse(self.name)
+        if path.member or state.vars.lookup("LOCATE", on_target=self):
+            return []
+
+        path.grist = ""
+        search = state.vars.lookup("SEARCH", on_target=self)
+        if listings and search and is_plain_name(path):
+            return [join_posix(search_dir) for search_dir in search] + ["."]
+
+        paths = []
+        for search_dir in search:
+            path.root = search_dir
+            paths.append(path.build(binding=True))
+
+        path.root = None
+        paths.append(path.build(binding=True))
+
+        if listings:
+            return [d for d, _ in map(split_dir, paths) if d is not None]
+
+        return paths
+
+    def search_listings(self, state: State, search: list, name: str):
+        """
+        search() for a name without directory, the candidates are looked up
+        in the directory listings. None if it's not found.
+        """
+
+        dir_index = state.dir_index
+        for search_dir in search:
+            directory = join_posix(search_dir)
+            if directory == ".":
+                res_path = name
+            elif directory.endswith("/"):
+                res_path = directory + name
+            else:
+                res_path = directory + "/" + name
+
+            if res_path in state.target_locations:
+                return res_path
+
+            found = dir_index.contains(directory, name)
+            if found is None:
+                found = state.file_exists(res_path)
+            else:
+                state.side_effects += 1
+
+            if found:
+                return res_path
+
     def add_depends(self, state: State, targets: list):
         for target in targets:
             if isinstance(target, str):
@@ -709,48 +924,6 @@ class Target:
 
             self.includes.add(target)
 
-    def search_for_cycles(self, verbose=False, graph=None, cpass=0):
-        if self.circular_visited > cpass:
-            return
-
-        self.circular_visited += 1
-
-        top = False
-        if graph is None:
-            top = True
-            graph = graphlib.TopologicalSorter()
-
-        for inc in self.includes:
-            graph.add(self, inc)
-            inc.search_for_cycles(graph=graph, cpass=cpass)
-
-        for dep in self.depends:
-            dep.search_for_cycles(graph=graph, cpass=cpass)
-
-        if top:
-            cycle = None
-            try:
-                graph.prepare()
-            except graphlib.CycleError as e:
-                cycle = e.args[1]
-
-            removed = False
-            if cycle is not None:
-                try:
-                    cycle[-1].includes.remove(cycle[-2])
-                    removed = True
-
-                    if verbose:
-                        print(
-                            f"removed circular dependency: {cycle[-2]} from {cycle[-1]}"
-                        )
-                except KeyError:
-                    pass
-
-            # we removed one, now we need another pass
-            if removed:
-                return self.search_for_cycles(verbose=verbose, cpass=cpass + 1)
-
     def __hash__(self):
         return hash(self.name)
 
@@ -1,5 +1,17 @@
+import operator
+
 from jamp import executors
+from jamp.executors import (
+    exec_assign,
+    exec_assign_on_target,
+    exec_include,
+    exec_local_assign,
+    exec_on_target,
+    exec_rule,
+)
 from jamp.classes import Actions, Exec, Rule, State
+from jamp.expand import expand, template
+from jamp.jam_builtins import native_rule, traced
 from jamp.jam_syntax import Arg, Node
 
 
@@ -10,12 +22,15 @@ class CompilerError(Exception):
 def compile(state: State, node: tuple | list):
     match node:
         case Arg(value=(Node.FUNC, *r)):
-            return Exec(executors.exec_rule, r)
+            return Exec(traced(state, executors.exec_rule), r)
         case Arg(value=(Node.FUNC_ON, *r)):
-            return Exec(executors.exec_rule_on_target, r)
+            return Exec(traced(state, executors.exec_rule_on_target), r)
+        case Arg(value=str() as value) if value:
+            # parsed once, literals are folded to constant lists
+            return template(value)
         case Arg(value=(Node.RETURN_ON, targets, val)):
             return Exec(
-                executors.exec_return_on_target,
+                traced(state, executors.exec_return_on_target),
                 (
                     compile(state, targets),
                     compile(state, val),
@@ -24,10 +39,10 @@ def compile(state: State, node: tuple | list):
         case (Node.RULE, *r):
             return Exec(compile_rule, r)
         case (Node.ASSIGN, *r):
-            return Exec(executors.exec_assign, compile(state, r))
+            return Exec(traced(state, executors.exec_assign), compile(state, r))
         case (Node.ARG_ON_TARGET, target, var, assign_type, assign_list):
             return Exec(
-                executors.exec_assign_on_target,
+                traced(state, executors.exec_assign_on_target),
                 (
                     (compile(state, target)),
                     compile(state, var),
@@ -36,18 +51,24 @@ def compile(state: State, node: tuple | list):
                 ),
             )
         case (Node.LOCAL, name, value):
-            return Exec(executors.exec_local_assign, (name, compile(state, value)))
+            return Exec(
+                traced(state, executors.exec_local_assign),
+                (name, compile(state, value)),
+            )
         case (Node.CALL, rule_name, lol):
             return Exec(
-                executors.exec_rule, (compile(state, rule_name), compile(state, lol))
+                traced(state, executors.exec_rule),
+                (compile(state, rule_name), compile(state, lol)),
             )
         case (Node.ACTIONS, *r):
             return Exec(compile_actions, r)
         case (Node.WHILE, cond, block):
-            return Exec(executors.exec_while, (cond, compile(state, block)))
+            return Exec(
+                traced(state, executors.exec_while), (cond, compile(state, block))
+            )
         case (Node.FOR, varname, items, block):
             return Exec(
-                executors.exec_for,
+                traced(state, executors.exec_for),
                 (varname, compile(state, items), compile(state, block)),
             )
         case (Node.LOL, *r):
@@ -57,15 +78,17 @@ def compile(state: State, node: tuple | list):
         case (Node.CONTINUE, not_used):
             return Exec(executors.exec_continue, (not_used,))
         case (Node.RETURN, val):
-            return Exec(executors.exec_return, (compile(state, val),))
+            return Exec(traced(state, executors.exec_return), (compile(state, val),))
         case (Node.IF, *r):
             return compile_if(state, *r)
         case (Node.SWITCH, *r):
             return compile_switch(state, *r)
         case (Node.INCLUDE, arg):
-            return Exec(executors.exec_include, (arg,))
+            return Exec(traced(state, executors.exec_include), (arg,))
         case (Node.ON_TARGET, target, block):
-            return Exec(executors.exec_on_target, (target, compile(state, block)))
+            return Exec(
+                traced(state, executors.exec_on_target), (target, compile(state, block))
+            )
         case [*items]:
             # block
             res = []
@@ -80,7 +103,10 @@ def compile(state: State, node: tuple | list):
 
 
 def compile_rule(state: State, name: str, params: tuple | None, block: tuple):
-    state.rules[name] = Rule(name, compile(state, params), compile(state, block))
+    rule = Rule(name, compile(state, params), block)
+    rule.native = native_rule(name, block)
+    state.rules_changed(name)
+    state.rules[name] = rule
 
 
 def compile_actions(state: State, flags, name, bindlist, script):
@@ -91,12 +117,13 @@ def compile_actions(state: State, flags, name, bindlist, script):
         compile_rule(state, name, [], [])
 
     action = Actions(name, flags, bindlist, script)
+    state.rules_changed(name)
     state.actions[name] = action
 
 
 def compile_if(state: State, expr, true_block, false_block=None):
     return Exec(
-        executors.exec_if,
+        traced(state, executors.exec_if),
         (
             compile(state, expr),
             compile(state, true_block),
@@ -106,7 +133,375 @@ def compile_if(state: State, expr, true_block, false_block=None):
 
 
 def compile_switch(state: State, arg, cases):
-    return Exec(
-        executors.exec_switch,
-        (arg, [(item[1], compile(state, item[2])) for item in cases]),
-    )
+    # an empty case has no body
+    table = executors.SwitchTable([(c[1], compile(state, c[2] or [])) for c in cases])
+    return Exec(traced(state, executors.exec_switch), (arg, table))
+
+
+#
+# Closure backend.
+#
+# Statements and conditions are turned into nested Python closures, control
+# flow (break/continue, scopes, which statements can return a value) is
+# resolved here once instead of on every run. The Exec tree above is kept
+# for tracing (--trace), it's easier to inspect and gives a traceback.
+#
+
+
+def compile_block(state: State, node: list | None):
+    """Compile statements with the backend selected for the state"""
+
+    if state.trace_on:
+        return compile(state, node)
+
+    return closure_block(state, node)
+
+
+def _noop(state: State):
+    return None
+
+
+def closure_block(state: State, items: list | None):
+    """
+    Returns a function with the same result as executors.run() on the
+    compiled list of statements.
+    """
+
+    if isinstance(items, tuple):
+        # a single statement
+        items = [items]
+
+    fns = []
+    returning = False
+    flow = None
+
+    for item in items or ():
+        match item:
+            case None:
+                # an empty block
+                continue
+            case (Node.BREAK, _):
+                # the rest of the block is unreachable
+                flow = executors.FLOW_BREAK
+                break
+            case (Node.CONTINUE, _):
+                flow = executors.FLOW_CONTINUE
+                break
+
+        fn, returns = closure_statement(state, item)
+        if fn is not None:
+            fns.append(fn)
+            returning = returning or returns
+
+    if not returning:
+        if not fns:
+            return _noop if flow is None else lambda state: flow
+
+        if len(fns) == 1 and flow is None:
+            return fns[0]
+
+        fns = tuple(fns)
+
+        def silent_block(state: State):
+            for fn in fns:
+                fn(state)
+
+            return flow
+
+        return silent_block
+
+    fns = tuple(fns)
+    Result = executors.Result
+    FLOW_BREAK = executors.FLOW_BREAK
+    FLOW_CONTINUE = executors.FLOW_CONTINUE
+
+    def block(state: State):
+        res = None
+        for fn in fns:
+            ret = fn(state)
+            if ret:
+                if ret.__class__ is Result:
+                    res = ret
+                elif ret == FLOW_BREAK or ret == FLOW_CONTINUE:
+                    return ret
+
+        return flow or res
+
+    return block
+
+
+def closure_scoped(body):
+    """Same as executors.exec_block() on a compiled block"""
+
+    def scoped(state: State):
+        state.vars.push()
+        ret = body(state)
+        state.vars.pop()
+        return ret
+
+    return scoped
+
+
+def closure_statement(state: State, node) -> tuple:
+    """Returns a closure and if it could return a value or a flow code"""
+
+    match node:
+        case (Node.RULE, name, params, block):
+
+            def rule(state: State):
+                compile_rule(state, name, params, block)
+
+            return rule, False
+
+        case (Node.ASSIGN, name, assign_type, assign_list):
+            name = compile(state, name)
+            assign_list = compile(state, assign_list)
+
+            def assign(state: State):
+                exec_assign(state, name, assign_type, assign_list)
+
+            return assign, False
+
+        case (Node.ARG_ON_TARGET, name, targets, assign_type, assign_list):
+            name = compile(state, name)
+            targets = compile(state, targets)
+            assign_list = compile(state, assign_list)
+
+            def assign_on_target(state: State):
+                exec_assign_on_target(state, name, targets, assign_type, assign_list)
+
+            return assign_on_target, False
+
+        case (Node.LOCAL, names, value):
+            value = compile(state, value)
+
+            def local(state: State):
+                exec_local_assign(state, names, value)
+
+            return local, False
+
+        case (Node.CALL, rule_name, lol):
+            rule_name = compile(state, rule_name)
+            lol = compile(state, lol)
+
+            def call(state: State):
+                return exec_rule(state, rule_name, lol)
+
+            return call, True
+
+        case (Node.ACTIONS, *r):
+
+            def actions(state: State):
+                compile_actions(state, *r)
+
+            return actions, False
+
+        case (Node.RETURN, val):
+            val = compile(state, val)
+            Result = executors.Result
+
+            def return_(state: State):
+                return Result(expand(state, val))
+
+            return return_, True
+
+        case (Node.IF, expr, true_block, *false_block):
+            return closure_if(state, expr, true_block, *false_block)
+
+        case (Node.WHILE, expr, block):
+            return closure_while(state, expr, block), False
+
+        case (Node.FOR, varname, items, block):
+            return closure_for(state, varname, items, block), False
+
+        case (Node.SWITCH, arg, cases):
+            return closure_switch(state, arg, cases), True
+
+        case (Node.INCLUDE, arg):
+            arg = compile(state, arg)
+
+            def include(state: State):
+                exec_include(state, arg)
+
+            return include, False
+
+        case (Node.ON_TARGET, targets, block):
+            targets = compile(state, targets)
+            block = closure_block(state, block)
+
+            def on_target(state: State):
+                exec_on_target(state, targets, block)
+
+            return on_target, False
+
+        case [*items]:
+            # a nested block, it does not get its own scope
+            return closure_block(state, items), True
+
+    compiled = compile(state, node)
+    if isinstance(compiled, Exec):
+        return compiled.execute, True
+
+    raise CompilerError(f"unexpected statement: {node}")
+
+
+def closure_if(state: State, expr, true_block, false_block=None):
+    cond = closure_cond(state, expr)
+    true_fn = closure_block(state, true_block)
+    false_fn = closure_block(state, false_block)
+
+    if true_fn is _noop and false_fn is _noop:
+
+        def cond_only(state: State):
+            cond(state)
+
+        return cond_only, False
+
+    def if_(state: State):
+        fn = true_fn if cond(state) else false_fn
+        state.vars.push()
+        ret = fn(state)
+        state.vars.pop()
+        return ret
+
+    return if_, True
+
+
+def closure_while(state: State, expr, block):
+    cond = closure_cond(state, expr)
+    body = closure_scoped(closure_block(state, block))
+    FLOW_BREAK = executors.FLOW_BREAK
+
+    def while_(state: State):
+        while cond(state):
+            if body(state) == FLOW_BREAK:
+                break
+
+    return while_
+
+
+def closure_for(state: State, varname, items, block):
+    items = compile(state, items)
+    body = closure_scoped(closure_block(state, block))
+    FLOW_BREAK = executors.FLOW_BREAK
+
+    def for_(state: State):
+        values = expand(state, items)
+        name = expand(state, varname)
+        if len(name) == 0:
+            raise executors.ExecutionError(
+                f"got empty argument in for after expanding {varname}"
+            )
+
+        name = name[0]
+        for item in values:
+            state.vars.set(name, [item])
+            if body(state) == FLOW_BREAK:
+                break
+
+    return for_
+
+
+def closure_switch(state: State, arg, cases):
+    compiled = []
+    for _, pattern, block in cases:
+        # an empty case has no body, empty blocks are skipped as in compile()
+        block = [item for item in block or () if item is not None]
+        if len(block) and isinstance(block[0], list):
+            # only the first braced block is executed, in its own scope
+            fn = closure_scoped(closure_block(state, block[0]))
+        else:
+            fn = closure_block(state, block)
+
+        compiled.append((pattern, fn))
+
+    table = executors.SwitchTable(compiled)
+    arg = compile(state, arg)
+
+    def switch(state: State):
+        found = table.find(expand(state, arg))
+        if found:
+            return found[1](state)
+
+    return switch
+
+
+def closure_cond(state: State, expr):
+    """Compile an expression to a function returning var_bool() of its value"""
+
+    match expr:
+        case (Node.EXPR, arg):
+            arg = compile(state, arg)
+
+            def cond(state: State):
+                val = expand(state, arg)
+                return len(val) > 0 and len(val[0]) > 0
+
+            return cond
+
+        case (Node.EXPR_BOP, (left, "&&", right)):
+            left = closure_cond(state, left)
+            right = closure_cond(state, right)
+            return lambda state: left(state) and right(state)
+
+        case (Node.EXPR_BOP, (left, "||", right)):
+            left = closure_cond(state, left)
+            right = closure_cond(state, right)
+            return lambda state: left(state) or right(state)
+
+        case (Node.EXPR_UNARY, "!", arg):
+            arg = closure_cond(state, arg)
+            return lambda state: not arg(state)
+
+        case (Node.EXPR_BLOCK, block):
+            return closure_cond(state, block)
+
+    # comparisons are already boolean
+    return closure_expr(state, expr)
+
+
+def closure_expr(state: State, expr):
+    """Compile an expression to a function returning the same as evaluate_expr"""
+
+    match expr:
+        case (Node.EXPR, arg):
+            arg = compile(state, arg)
+            return lambda state: expand(state, arg)
+
+        case (Node.EXPR_BOP, (left, "in", right)):
+            left = compile(state, left)
+            right = compile(state, right)
+            return lambda state: set(expand(state, left)).issubset(expand(state, right))
+
+        case (Node.EXPR_BOP, (left, "&&" | "||", right)):
+            return closure_cond(state, expr)
+
+        case (Node.EXPR_BOP, (left, op, right)):
+            func = COMPARISONS.get(op)
+            if func is None:
+                raise executors.ExecutionError(f"unexpected binary operation: {op}")
+
+            left = closure_expr(state, left)
+            right = closure_expr(state, right)
+            return lambda state: func(left(state), right(state))
+
+        case (Node.EXPR_UNARY, "!", _):
+            return closure_cond(state, expr)
+
+        case (Node.EXPR_UNARY, op, _):
+            raise executors.ExecutionError(f"unexpected unary operation: {op}")
+
+        case (Node.EXPR_BLOCK, block):
+            return closure_expr(state, block)
+
+    raise executors.ExecutionError(f"could not match an expression: {expr}")
+
+
+COMPARISONS = {
+    "=": operator.eq,
+    "!=": operator.ne,
+    "<": operator.lt,
+    ">": operator.gt,
+    "<=": operator.le,
+    ">=": operator.ge,
+}
@@ -0,0 +1,166 @@
+#
+# dirindex.py - directory listings shared by binding, Glob, PathExists
+# and include
+#
+# Every directory is read once per run with os.scandir. Existence checks
+# of paths in read directories are dictionary lookups instead of stat
+# calls, binding a target against a long SEARCH list doesn't touch the
+# filesystem for the directories already known.
+#
+# Names are compared as they are, so existence checks use the listings
+# only on Linux (case sensitive names, POSIX paths).
+#
+# Before binding, the directories (or elsewhere, the paths) all targets
+# could probe are read by a thread pool, on network filesystems the round
+# trips overlap.
+#
+
+import os
+import time
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+
+from jamp.paths import check_linux
+
+
+def scan_dir(directory: str) -> tuple[dict[str, bool] | None, bool]:
+    """Names in the directory with their kinds and if it's unreadable"""
+
+    try:
+        with os.scandir(directory or ".") as it:
+            entries = {}
+            for entry in it:
+                try:
+                    if entry.is_symlink() and not os.path.exists(entry.path):
+                        # dangling links can't be stat'ed
+                        continue
+
+                    entries[entry.name] = entry.is_dir()
+                except OSError:
+                    continue
+    except (FileNotFoundError, NotADirectoryError):
+        return None, False
+    except OSError:
+        return None, True
+
+    return entries, False
+
+
+def split_dir(path: str) -> tuple[str | None, str]:
+    """The directory to look the name up, None if the listing can't be used"""
+
+    directory, _, name = path.rpartition("/")
+    if not name or name == "." or name == "..":
+        return None, name
+
+    if not directory:
+        directory = "/" if path.startswith("/") else "."
+
+    return directory, name
+
+
+def stat_or_none(path: str) -> os.stat_result | None:
+    try:
+        return os.stat(path)
+    except OSError:
+        return None
+
+
+def timed(fn: Callable, arg):
+    start = time.perf_counter()
+    res = fn(arg)
+    return res, time.perf_counter() - start
+
+
+def run_parallel(fn: Callable, args: list, jobs: int) -> tuple[list, float]:
+    """fn(arg) for every argument in a thread pool, and the time the calls took"""
+
+    if not args:
+        return [], 0.0
+
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        results = list(pool.map(lambda arg: timed(fn, arg), args))
+
+    return [res for res, _ in results], sum(spent for _, spent in results)
+
+
+class DirIndex:
+    def __init__(self):
+        # directory -> {name: is_dir}, None if it can't be listed
+        self.entries: dict[str, dict[str, bool] | None] = {}
+
+        # name -> directories having it
+        self.dirs_by_name: dict[str, set[str]] = {}
+
+        # directories without read permission, their files can exist
+        self.unreadable: set[str] = set()
+
+        self.scans = 0
+
+    def listing(self, directory: str) -> dict[str, bool] | None:
+        """Names in the directory with their kinds, or None"""
+
+        try:
+            return self.entries[directory]
+        except KeyError:
+            pass
+
+        self.add(directory, scan_dir(directory))
+        return self.entries[directory]
+
+    def add(self, directory: str, scanned: tuple[dict | None, bool]):
+        entries, unreadable = scanned
+
+        self.scans += 1
+        self.entries[directory] = entries
+        if unreadable:
+            self.unreadable.add(directory)
+
+        for name in entries or ():
+            dirs = self.dirs_by_name.get(name)
+            if dirs is None:
+                self.dirs_by_name[name] = {directory}
+            else:
+                dirs.add(directory)
+
+    def prefetch(self, dirs, jobs: int) -> float:
+        """Reads the directories in parallel, returns the time the reads took"""
+
+        dirs = [d for d in set(dirs) if d not in self.entries]
+        results, busy = run_parallel(scan_dir, dirs, jobs)
+        for directory, scanned in zip(dirs, results):
+            self.add(directory, scanned)
+
+        return busy
+
+    def contains(self, directory: str, name: str) -> bool | None:
+        """If the directory has the name, None if the listing can't tell"""
+
+        if not check_linux():
+            return None
+
+        entries = self.listing(directory)
+        if entries is None:
+            return None if directory in self.unreadable else False
+
+        return name in entries
+
+    def exists(self, path: str) -> bool | None:
+        """If the path exists, None if the listings can't tell"""
+
+        if not check_linux():
+            return None
+
+        directory, name = split_dir(path)
+        if directory is None:
+            return None
+
+        if self.listing(directory) is None:
+            if directory in self.unreadable:
+                return None
+
+            # a missing directory or a file, the name can't be there
+            return False
+
+        dirs = self.dirs_by_name.get(name)
+        return dirs is not None and directory in dirs
@@ -1,13 +1,19 @@
+import os
 import sys
+import time
+from collections.abc import Callable
 
-from jamp.classes import Exec, Rule, State, Target, UpdatingAction
-from jamp.expand import expand, expand_lol, flatten, iter_var, lol_get
-from jamp.jam_builtins import Builtins, output, trace, traceinfo
+from jamp.classes import Exec, Rule, State, Target, UpdatingAction, update_vars
+from jamp.expand import expand, expand_lol, iter_var, lol_get
+from jamp.jam_builtins import Builtins, output, trace, traceinfo, traced
 from jamp.jam_syntax import Arg, Node
-from jamp.pattern import match
+from jamp.paths import check_linux, join_posix
+from jamp.pattern import compile_pattern, is_literal
+from jamp.rule_memo import memoized, pure_rule
 
 builtins = Builtins()
 complained_rules = set()
+complained_targets = set()
 
 FLOW_BREAK = 1
 FLOW_CONTINUE = 2
@@ -19,11 +25,15 @@ class Result:
         self.val = val
 
 
-def run(state: State, cmds: list | Exec) -> int | None:
+def run(state: State, cmds: list | Exec | Callable) -> int | None:
     """Starting point of tasks execution"""
 
     res = None
     if cmds:
+        if callable(cmds):
+            # a block from the closure backend
+            return cmds(state)
+
         if isinstance(cmds, Exec):
             return cmds.execute(state)
 
@@ -44,12 +54,181 @@ def run(state: State, cmds: list | Exec) -> int | None:
     return res
 
 
-def bind_targets(state: State, search_headers="base"):
-    """Bind target to actual locations"""
+def prefetch(state: State, targets, jobs: int, headers=False) -> tuple[float, float]:
+    """
+    Reads the directories (or stats the paths) binding of the targets will
+    check with a thread pool. With `headers` it stats bound files to be
+    scanned for headers. Returns the wall time and the time of the calls.
+    """
 
-    target: Target = None
+    start = time.perf_counter()
+    listings = check_linux()
+
+    probes = set()
+    for target in targets:
+        if not headers:
+            probes.update(target.probes(state, listings))
+        elif (
+            target.boundname
+            and state.vars.lookup("HDRSCAN", on_target=target)
+            and state.vars.lookup("HDRRULE", on_target=target)
+        ):
+            probes.add(target.boundname)
+
+    if listings and not headers:
+        busy = state.dir_index.prefetch(probes, jobs)
+    else:
+        busy = state.prefetch_stats(probes, jobs)
+
+    return time.perf_counter() - start, busy
 
+
+def default_roots(state: State) -> list[Target]:
+    """Pseudo-targets nothing depends on (all, install, clean...) and generators"""
+
+    used = set()
     for target in state.targets.values():
+        used.update(target.depends)
+        used.update(target.includes)
+
+    return [
+        target
+        for target in state.targets.values()
+        if target.generated or (target.notfile and target not in used)
+    ]
+
+
+def action_edges(state: State, upd_action: UpdatingAction):
+    """Targets an updating action needs bound: outputs, sources and BIND values"""
+
+    yield from upd_action.sources
+
+    for target in upd_action.targets:
+        yield target
+
+        for var in upd_action.bindvars or ():
+            for name in state.vars.lookup(var, on_target=target):
+                bound = state.targets.get(name)
+                if bound is not None:
+                    yield bound
+
+
+def reachable_targets(state: State, roots: list[Target]) -> set[Target]:
+    """Targets reachable from the roots by dependencies, includes and actions"""
+
+    seen = set(roots)
+    stack = list(roots)
+    while stack:
+        target = stack.pop()
+        edges = [target.depends, target.includes]
+        if target.build_step is not None:
+            actions = [target.build_step[1]]
+            while actions:
+                upd_action = actions.pop()
+                actions.extend(upd_action.next)
+                edges.append(action_edges(state, upd_action))
+
+        for edge in edges:
+            for dep in edge:
+                if dep not in seen:
+                    seen.add(dep)
+                    stack.append(dep)
+
+    return seen
+
+
+def find_unreachable(state: State, roots: list[str]) -> set[Target]:
+    """
+    Targets not needed for the roots (or for the default roots if the list
+    is empty). Generator targets (build.ninja) and `dirs` are always needed.
+    """
+
+    if not roots:
+        targets = default_roots(state)
+    else:
+        targets = [target for target in state.targets.values() if target.generated]
+        for name in ("dirs", *roots):
+            target = state.targets.get(name)
+            if target is not None:
+                targets.append(target)
+            elif name not in complained_targets:
+                print(f"jamp: unknown target {name}")
+                complained_targets.add(name)
+
+    reachable = reachable_targets(state, targets)
+    return {target for target in state.targets.values() if target not in reachable}
+
+
+def in_subtree(path: str | None, directory: str) -> bool:
+    if not path:
+        return False
+
+    return (
+        directory == "."
+        or path == directory
+        or path.startswith(directory.rstrip("/") + "/")
+    )
+
+
+def select_roots(state: State, selectors: list[str]) -> list[str]:
+    """
+    Target names for `--only`: a selector is a directory if it ends with `/`
+    or exists, the targets built there or from sources there are selected.
+    Otherwise it's a target name, or a directory if there is no such target.
+    Locations are found from LOCATE and SEARCH, the filesystem isn't checked.
+    """
+
+    roots = []
+    for selector in selectors:
+        is_dir = selector.endswith("/") or os.path.isdir(selector)
+        if not is_dir and selector in state.targets:
+            roots.append(selector)
+            continue
+
+        directory = join_posix(selector)
+        found = 0
+        for targets, upd_action in state.build_steps:
+            sources = list(upd_action.sources)
+            for linked in upd_action.next:
+                sources += linked.sources
+
+            if any(
+                in_subtree(path, directory)
+                for target in (*targets, *sources)
+                for path in target.bound_names(state)
+            ):
+                roots += (target.name for target in targets)
+                found += 1
+
+        if not found:
+            print(f"jamp: nothing selected by {selector}")
+
+    return roots
+
+
+def bind_targets(state: State, search_headers="base", stat_jobs=0, roots=None):
+    """
+    Bind target to actual locations. With `roots` (a list of target names,
+    empty for the default ones) only the targets they need are bound and
+    scanned, the rest are kept in state.unreachable.
+    """
+
+    target: Target = None
+    spent = [0.0, 0.0]
+
+    def prefetch_for(targets, headers=False):
+        if stat_jobs > 0:
+            for i, value in enumerate(prefetch(state, targets, stat_jobs, headers)):
+                spent[i] += value
+
+    unreachable = set() if roots is None else find_unreachable(state, roots)
+    state.unreachable = unreachable
+
+    def needed():
+        return [t for t in state.targets.values() if t not in unreachable]
+
+    prefetch_for(needed())
+    for target in needed():
         target.bind_location(state)
 
     db = None
@@ -67,22 +246,52 @@ def bind_targets(state: State, search_headers="base"):
             db = scan_grep_output(state, pattern[0])
 
     if search_headers != "none":
-        for target in tuple(state.targets.values()):
-            # tuple is because targets dict will change while searching
+        if db is None:
+            prefetch_for(needed(), headers=True)
+
+        # the list is because targets dict will change while searching
+        for target in needed():
             if target.boundname:
                 target.find_headers(state, db=db)
 
+        # found headers can be declared targets not needed before
+        while unreachable:
+            found = unreachable - find_unreachable(state, roots)
+            if not found:
+                break
+
+            unreachable -= found
+            for target in found:
+                target.bind_location(state)
+
+            for target in found:
+                if target.boundname:
+                    target.find_headers(state, db=db)
+
         # now bind found headers
-        for target in state.targets.values():
+        prefetch_for(needed())
+        for target in needed():
             target.bind_location(state, strict=True)
 
+    if state.verbose and unreachable:
+        print(f"...skipped {len(unreachable)} unreachable target(s)...")
+
+    if state.verbose and stat_jobs > 0:
+        wall, busy = spent
+        print(
+            f"...prefetched in {wall:.2f}s with {stat_jobs} jobs, "
+            f"{max(busy - wall, 0):.2f}s saved..."
+        )
+
 
 class ExecutionError(Exception):
     pass
 
 
 def check_empty_val(assign_list):
-    return bool(assign_list and isinstance(assign_list[0], Arg) and assign_list[0].value == "")
+    return bool(
+        assign_list and isinstance(assign_list[0], Arg) and assign_list[0].value == ""
+    )
 
 
 @trace("assign")
@@ -99,21 +308,12 @@ def exec_assign(
             assign = True
         elif assign_type == "?=" or assign_type[0] == "d":
             # if variable is defined here, just skip
-            scope = state.vars.get_scope(name)
-            if scope is None:
-                assign = True
-            else:
-                val = scope.get(name)
-                if not val:
-                    assign = True
+            assign = not state.vars.is_set(name)
 
         elif assign_type == "+=":
             # add to variable
             value = expand(state, assign_list)
-            curval = state.vars.get(name)
-            if curval:
-                state.vars.set(name, list(iter_var(curval)) + list(iter_var(value)))
-            elif value:
+            if not state.vars.append(name, value) and value:
                 # original jam skips setting var if value is empty
                 assign = True
 
@@ -128,32 +328,43 @@ def exec_assign_on_target(
 ):
     """Bind a variable to specific targets"""
     targets_var = expand(state, targets)
+    names = expand(state, name_arg)
+    value = expand(state, assign_list, skip_empty=False)
+
+    for varname in names:
+        state.vars.touch(varname)
+
+    # Targets that share a variables table get one new table, private
+    # tables are changed in place.
+    # id(old table) -> [old table, new table, owned lists, targets]
+    updated = {}
 
     for target_name in iter_var(targets_var):
         target = Target.bind(state, target_name)
 
-        value = expand(state, assign_list, skip_empty=False)
-        names = expand(state, name_arg)
-        target_vars = target.vars
-
-        for varname in names:
-            if assign_type == "=":
-                target_vars[varname] = value
-            elif assign_type == "?=":
-                if varname not in target_vars:
-                    target_vars[varname] = value
-            elif assign_type == "+=" and value:
-                # note: skip adding if the value is empty
-                if varname not in target_vars:
-                    target_vars[varname] = value
-                else:
-                    curval = flatten(target_vars[varname])
-                    if curval:
-                        target_vars[varname] = list(iter_var(curval)) + list(
-                            iter_var(value)
-                        )
-                    else:
-                        target_vars[varname] = value
+        if target.owned_vars is not None:
+            update_vars(target.vars, target.owned_vars, names, assign_type, value)
+            continue
+
+        old = target.vars
+        entry = updated.get(id(old))
+        if entry is None:
+            table = dict(old)
+            owned = {}
+            update_vars(table, owned, names, assign_type, value)
+            entry = updated[id(old)] = [old, table, owned, []]
+
+        target.vars = entry[1]
+        entry[3].append(target)
+
+    for _, table, owned, users in updated.values():
+        if len(users) == 1 and users[0].vars is table:
+            users[0].owned_vars = owned
+
+    if updated:
+        # assignments inside `on target` blocks are seen there
+        for overlay in state.overlays:
+            overlay.refresh()
 
 
 def exec_break(state: State, arg) -> int:
@@ -276,13 +487,14 @@ def exec_one_rule(state: State, name: str, params: list):
             and name != state.current_rule.name
         ):
             # create an updating action for targets
-            exec_rule_action(state, state.current_rule, name, params)
+            traced(state, exec_rule_action)(state, state.current_rule, name, params)
             return
 
         if name != "Clean" and name not in complained_rules:
             # we just ignore clean rules, ninja will do cleaning part
             output(f"jamp: unknown rule {name}")
             complained_rules.add(name)
+            state.side_effects += 1
 
         return
 
@@ -291,21 +503,69 @@ def exec_one_rule(state: State, name: str, params: list):
 
     # create an updating action for actions block with the same name as the rule
     if name in state.actions:
-        exec_rule_action(state, rule, name, params)
+        traced(state, exec_rule_action)(state, rule, name, params)
+
+    return call_rule(state, rule, params)
+
+
+def call_rule(state: State, rule: Rule, params: list):
+    """Execute rule commands"""
 
-    # execute rule commands
     old_params = state.params
     old_rule = state.current_rule
 
     state.current_rule = rule
     state.params = params
-    ret = exec_block(state, rule.commands)
+    ret = exec_block(state, rule.compiled(state))
     state.params = old_params
     state.current_rule = old_rule
 
     return ret
 
 
+def rule_dispatcher(state: State, name: str):
+    """
+    Returns a function(state, params) doing the same as exec_one_rule() for
+    the name. It's cached in state.rule_dispatch until the rule or actions
+    with this name are redefined. Unchanged Jambase rules with Python
+    versions are dispatched to them, calls of pure rules are memoized.
+    """
+
+    fn = state.rule_dispatch.get(name)
+    if fn is not None:
+        return fn
+
+    builtin = getattr(builtins, name.lower(), None)
+    rule: Rule = state.rules.get(name)
+
+    if builtin:
+        fn = builtin
+    elif rule is None:
+        # actions without a rule depend on the calling rule
+        def fn(state: State, params: list):
+            return exec_one_rule(state, name, params)
+
+    elif name in state.actions:
+
+        def fn(state: State, params: list):
+            exec_rule_action(state, rule, name, params)
+            return call_rule(state, rule, params)
+
+    else:
+        if rule.native is not None:
+            fn = rule.native
+        else:
+
+            def fn(state: State, params: list):
+                return call_rule(state, rule, params)
+
+        if name in state.memoized_rules or pure_rule(state, name):
+            fn = memoized(rule, fn)
+
+    state.rule_dispatch[name] = fn
+    return fn
+
+
 @trace("rules")
 def exec_rule(state: State, name: Arg, args):
     names = expand(state, name)
@@ -313,7 +573,11 @@ def exec_rule(state: State, name: Arg, args):
 
     res = []
     for rule_name in names:
-        rule_res: Result | None = exec_one_rule(state, rule_name, params)
+        if state.trace_on:
+            rule_res = exec_one_rule.traced(state, rule_name, params)
+        else:
+            rule_res = rule_dispatcher(state, rule_name)(state, params)
+
         if isinstance(rule_res, Result):
             res += rule_res.val
         elif rule_res == FLOW_DEBUG:
@@ -326,6 +590,7 @@ def exec_rule(state: State, name: Arg, args):
 @trace("include")
 def exec_include(state: State, location):
     filenames = expand(state, location)
+    state.side_effects += 1
 
     for filename in filenames:
         t = Target.bind(state, filename)
@@ -385,7 +650,7 @@ def exec_rule_on_target(state: State, targets, name, args):
 
         rule_res = None
         with target.overlay(state):
-            rule_res = exec_rule(state, name, args)
+            rule_res = traced(state, exec_rule)(state, name, args)
 
         if isinstance(rule_res, Result):
             res += rule_res.val
@@ -525,27 +790,68 @@ def exec_for(state: State, var, items, block):
             continue
 
 
-@trace("switch", len_args=1)
-def exec_switch(state: State, arg, cases):
-    arg = expand(state, arg)
-
-    for pattern, block in cases:
-        matched = False
-        if not arg and pattern == "*":
-            matched = True
+class SwitchTable:
+    """
+    Cases of a switch statement. Literal patterns are found by a dict
+    lookup, patterns with wildcards are tried in order, and the first
+    matching case wins like in a sequential scan.
+    """
 
-        if arg and match(pattern, arg[0]) == 0:
-            matched = True
+    def __init__(self, cases: list[tuple[str, object]]):
+        self.literals = {}
+        self.wildcards = []
 
-        if matched:
-            if state.trace_on:
-                traceinfo(f"value: {arg[0]}")
-                traceinfo(f"matched on pattern: {pattern}")
+        # an empty value matches only "*"
+        self.empty = None
 
-            if len(block) and isinstance(block[0], list):
-                return exec_block(state, block[0])
+        for idx, (pattern, block) in enumerate(cases):
+            if is_literal(pattern):
+                self.literals.setdefault(pattern, (idx, pattern, block))
             else:
-                return run(state, block)
+                self.wildcards.append((idx, compile_pattern(pattern), pattern, block))
+
+            if pattern == "*" and self.empty is None:
+                self.empty = (pattern, block)
+
+    def find(self, value: list) -> tuple[str, object] | None:
+        """Returns (pattern, block) of the matched case"""
+
+        if not value:
+            return self.empty
+
+        value = value[0]
+        literal = self.literals.get(value)
+        last = sys.maxsize if literal is None else literal[0]
+
+        for idx, matcher, pattern, block in self.wildcards:
+            if idx > last:
+                break
+
+            if matcher(value):
+                return pattern, block
+
+        if literal is not None:
+            return literal[1:]
+
+    def __repr__(self):
+        return f"Switch[{len(self.literals)} literals, {len(self.wildcards)} patterns]"
+
+
+@trace("switch", len_args=1)
+def exec_switch(state: State, arg, cases: SwitchTable):
+    arg = expand(state, arg)
+
+    found = cases.find(arg)
+    if found:
+        pattern, block = found
+        if state.trace_on:
+            traceinfo(f"value: {arg[0] if arg else ''}")
+            traceinfo(f"matched on pattern: {pattern}")
+
+        if len(block) and isinstance(block[0], list):
+            return exec_block(state, block[0])
+        else:
+            return run(state, block)
 
 
 def exec_block(state, cmds):
@@ -1,15 +1,22 @@
-import itertools
 import re
-from dataclasses import dataclass
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from functools import lru_cache
 
 from jamp.classes import Exec, State, Vars
-from jamp.jam_syntax import Arg, Node
+from jamp.jam_syntax import Arg, Node, highlight
 from jamp.paths import Pathname
 
 MAGIC_COLON = "\x01"
 MAGIC_LEFT = "\x02"
 MAGIC_RIGHT = "\x03"
 
+# memoized expansions are dropped all at once after this number
+MEMO_SIZE = 65536
+
+# the same for results of file modifiers, separately for each modifier
+EDITS_CACHE_SIZE = 4096
+
 
 def lol_get(lol: list, idx: int):
     if lol and idx < len(lol):
@@ -63,19 +70,197 @@ def var_expand(
     performs "product" operations that occur in "$(var1)xxx$(var2)" or
     even "$($(var2))".
 
-    Returns a newly created list.
+    The string is parsed once to a Template, see template(). The returned
+    list could be shared and must not be modified.
+    """
+
+    return template(var).expand(lol, state_vars)
+
+
+class Template(ABC):
+    """
+    An argument string with its variable references parsed.
+    expand() only looks up values and makes the product. It prints as
+    the argument string (`source`), as Arg does.
+    """
+
+    __slots__ = ("source",)
+
+    @abstractmethod
+    def expand(self, lol: list | None, state_vars: Vars | dict) -> list:
+        pass
+
+    def evaluate(self, lol: list | None, state_vars: Vars | dict) -> list:
+        """Expansion without memoization"""
+
+        return self.expand(lol, state_vars)
+
+    def __repr__(self):
+        return highlight(self.source or '""', arg=True)
+
+
+class ConstTemplate(Template):
+    """A string without variables"""
+
+    __slots__ = ("value",)
+
+    def __init__(self, value: list):
+        self.value = value
+
+    def expand(self, lol, state_vars):
+        return self.value
+
+
+class ParamTemplate(Template):
+    """This gets alot of cases: $(<) and $(>)"""
+
+    __slots__ = ("idx",)
+
+    def __init__(self, idx: int):
+        self.idx = idx
+
+    def expand(self, lol, state_vars):
+        return lol_get(lol, self.idx)
+
+
+class VarTemplate(Template):
     """
+    prefix$(inside)remainder, where inside gives variable names with
+    modifiers and the remainder is a template too.
+
+    If the names of read variables are known beforehand (`name` is the
+    variable name without modifiers), the expansions are memoized in
+    Vars.memo by the versions of these variables and the used parameters.
+    """
+
+    __slots__ = ("prefix", "inside", "ref", "remainder", "deps", "params", "memoize")
+
+    def __init__(
+        self,
+        prefix: str,
+        inside: Template,
+        remainder: Template | None,
+        name: str | None = None,
+    ):
+        self.prefix = prefix
+        self.inside = inside
+        self.remainder = remainder
+
+        # usually the name is known beforehand
+        self.ref = None
+        if isinstance(inside, ConstTemplate) and len(inside.value) == 1:
+            try:
+                self.ref = var_ref(inside.value[0])
+            except ValueError:
+                # bad subscript, it will be raised on expansion
+                pass
+
+        self.deps = None
+        self.params = ()
+        self.memoize = False
+
+        if name is not None:
+            self.find_deps(var_ref(name))
+
+    def find_deps(self, own: "VarRef"):
+        names = set()
+        params = set()
+
+        if own.param is None:
+            names.add(own.name)
+        else:
+            params.add(own.param)
 
-    # This gets alot of cases: $(<) and $(>)
+        for part in (self.inside, self.remainder):
+            if isinstance(part, VarTemplate):
+                if part.deps is None:
+                    return
+
+                names.update(part.deps)
+                params.update(part.params)
+            elif isinstance(part, ParamTemplate):
+                params.add(part.idx)
+
+        self.deps = tuple(sorted(names))
+        self.params = tuple(sorted(params))
+
+        # a plain $(VAR) is cheaper to expand than to look up
+        self.memoize = (
+            self.ref is None or self.ref.edits is not None or self.remainder is not None
+        )
+
+    def expand(self, lol, state_vars):
+        if (
+            not self.memoize
+            or state_vars.__class__ is not Vars
+            or state_vars.current_context
+        ):
+            return self.evaluate(lol, state_vars)
+
+        if state_vars.reads is not None:
+            # the same names are read on a hit
+            state_vars.reads.update(self.deps)
+
+        versions = state_vars.versions
+        key = [self]
+        for name in self.deps:
+            key.append(versions.get(name, 0))
+        for idx in self.params:
+            key.append(tuple(lol_get(lol, idx)))
+        key = tuple(key)
+
+        memo = state_vars.memo
+        res = memo.get(key)
+        if res is not None:
+            state_vars.memo_hits += 1
+            return res
+
+        state_vars.memo_misses += 1
+        res = self.evaluate(lol, state_vars)
+        if len(memo) >= MEMO_SIZE:
+            memo.clear()
+
+        memo[key] = res
+        return res
+
+    def evaluate(self, lol, state_vars):
+        if self.ref is not None:
+            values = self.ref.values(lol, state_vars)
+        else:
+            values = []
+            for variable in self.inside.evaluate(lol, state_vars):
+                values.extend(var_ref(variable).values(lol, state_vars))
+
+        prefix = self.prefix
+        if self.remainder is None:
+            if prefix:
+                return [prefix + val for val in values]
+
+            return list(values)
+
+        remainder = self.remainder.evaluate(lol, state_vars)
+        return [prefix + val + rest for val in values for rest in remainder]
+
+
+@lru_cache(maxsize=8192)
+def template(var: str) -> Template:
+    """Parse a string with variable references"""
+
+    res = parse_template(var)
+    res.source = var
+    return res
+
+
+def parse_template(var: str) -> Template:
     if len(var) == 4 and var[0] == "$" and var[1] == "(" and var[3] == ")":
         if (var[2] == "1") or (var[2] == "<"):
-            return lol_get(lol, 0)
+            return ParamTemplate(0)
         if (var[2] == "2") or (var[2] == ">"):
-            return lol_get(lol, 1)
+            return ParamTemplate(1)
 
     i = var.find("$(")
     if i == -1:
-        return [var] if var else []
+        return ConstTemplate([var] if var else [])
 
     prefix = var[:i]
     depth = 1
@@ -101,108 +286,117 @@ def var_expand(
                 inside += var[i]
         i += 1
 
-    # Recursively expand variable name & rest of input
-    variables = var_expand(inside, lol, state_vars) if inside else []
+    # variable name & rest of input are expanded recursively
+    remainder = template(var[i:]) if i < len(var) else None
 
-    has_remainder = i < len(var)
-    remainder = var_expand(var[i:], lol, state_vars) if has_remainder else []
-    vals_out = []
+    # the name before modifiers, unless it's an expansion itself
+    name = inside.split(MAGIC_COLON, 1)[0].split(MAGIC_LEFT, 1)[0]
+    if "$(" in name:
+        name = None
 
-    # Now produce the result chain
-    for variable in variables:
+    return VarTemplate(prefix, template(inside), remainder, name)
+
+
+class VarRef:
+    """Variable name with : modifiers and [x-y] subscript"""
+
+    __slots__ = ("name", "param", "edits", "subscript", "sub1", "sub2")
+
+    def __init__(self, variable: str):
         varname = variable
 
         # Look for a : modifier in the variable name
         colon_idx = variable.find(MAGIC_COLON)
-        edits: Edits = None
+        self.edits: Edits = None
         if colon_idx > 0:
             varname = variable[:colon_idx]
-            edits = var_edit_parse(variable[colon_idx + 1 :])
+            self.edits = var_edit_parse(variable[colon_idx + 1 :])
 
         # Look for [x-y] subscripting
         # sub1 is x (0 default)
         # sub2 is length (-1 means forever)
         left_idx = variable.find(MAGIC_LEFT)
-        sub1 = 0
-        sub2 = 0
-
-        subscript = False
+        self.sub1 = 0
+        self.sub2 = 0
+        self.subscript = False
 
         if left_idx > 0:
-            subscript = True
+            self.subscript = True
             right_idx = varname[left_idx + 1 :].find(MAGIC_RIGHT)
             parts = varname[left_idx + 1 :][:right_idx].split("-")
-            sub1 = int(parts[0]) - 1
+            self.sub1 = int(parts[0]) - 1
             if len(parts) == 1:
-                sub2 = sub1 + 1
+                self.sub2 = self.sub1 + 1
             elif len(parts) == 2 and parts[1]:
-                sub2 = int(parts[1])
+                self.sub2 = int(parts[1])
             else:
-                sub2 = -1
+                self.sub2 = -1
 
             varname = varname[0:left_idx]
 
-        # Get variable value, specially handling $(<), $(>), $(n)
-        value = None
+        # $(<), $(>), $(n) are taken from the rule parameters
+        self.name = varname
+        self.param = None
 
         if varname == "<":
-            value = lol_get(lol, 0)
+            self.param = 0
         elif varname == ">":
-            value = lol_get(lol, 1)
+            self.param = 1
         elif len(varname) == 1 and varname[0] >= "1" and varname[0] <= "9":
-            value = lol_get(lol, int(varname) - 1)
+            self.param = int(varname) - 1
+
+    def values(self, lol: list | None, state_vars: Vars | dict) -> list:
+        if self.param is not None:
+            value = lol_get(lol, self.param)
         else:
-            value = state_vars.get(varname)
+            if state_vars.__class__ is Vars:
+                value = state_vars.lookup(self.name)
+            else:
+                value = state_vars.get(self.name)
             if value is None:
                 value = []
 
         if not isinstance(value, list):
             value = [value]
 
-        if subscript:
-            if sub2 == -1:
-                value = value[sub1:]
+        if self.subscript:
+            if self.sub2 == -1:
+                value = value[self.sub1 :]
             else:
-                value = value[sub1:sub2]
+                value = value[self.sub1 : self.sub2]
 
-        if not value and edits and edits.empty is not None:
+        edits = self.edits
+        if edits is None:
+            return value
+
+        if not value and edits.empty is not None:
             value = [edits.empty]
 
-        if value and edits and edits.join is not None:
+        if value and edits.join is not None:
             value = [edits.join.join(value)]
 
+        vals_out = []
         for val in value:
-            if edits:
-                if edits.filemods:
-                    val = var_edit_file(val, edits)
+            if edits.filemods:
+                val = var_edit_file(val, edits)
 
-                    if val == "":
-                        continue
+                if val == "":
+                    continue
 
-                if val and edits.upshift or edits.downshift:
-                    val = var_edit_shift(val, edits)
+            if val and edits.upshift or edits.downshift:
+                val = var_edit_shift(val, edits)
 
-                if edits.quote:
-                    val = var_edit_quote(val)
+            if edits.quote:
+                val = var_edit_quote(val)
 
             vals_out.append(val)
 
-    out = []
-    product_args = []
-
-    if prefix:
-        product_args.append([prefix])
+        return vals_out
 
-    product_args.append(vals_out)
 
-    if has_remainder:
-        product_args.append(remainder)
-
-    if product_args:
-        for product in itertools.product(*product_args):
-            out.append("".join(product))
-
-    return out
+@lru_cache(maxsize=8192)
+def var_ref(variable: str) -> VarRef:
+    return VarRef(variable)
 
 
 @dataclass
@@ -217,6 +411,9 @@ class Edits:
     join: None | str = None  # J -- join list with char
     zeroed: bool = False
 
+    # results of var_edit_file() by the original path
+    results: dict = field(default_factory=dict, repr=False, compare=False)
+
 
 # var_edit_parse() - parse : modifiers into PATHNAME structure
 #
@@ -317,6 +514,19 @@ def var_edit_parse(colon_part: str):
 
 # var_edit_file() - copy input target name to output, modifying filename
 def var_edit_file(path: str, edits: Edits):
+    results = edits.results
+    res = results.get(path)
+    if res is None:
+        res = edit_file(path, edits)
+        if len(results) >= EDITS_CACHE_SIZE:
+            results.clear()
+
+        results[path] = res
+
+    return res
+
+
+def edit_file(path: str, edits: Edits):
     res_path = Pathname()
     res_path.parse(path)
 
@@ -399,6 +609,8 @@ def var_string(
 
 def _expand(state: State, arg: Arg | tuple | str, skip_empty: bool) -> list:
     """Expand an argument whose recursive results are already lists."""
+    if isinstance(arg, Template):
+        return arg.expand(state.params, state.vars)
     if arg is None or (skip_empty and arg == ""):
         return []
     if arg == "":
@@ -0,0 +1,336 @@
+#
+# graph.py - the target graph frozen after binding
+#
+# Targets get integer ids in the order they were created, and their
+# depends and includes are kept in compact arrays (CSR layout): the edges
+# of target i are edges[offsets[i]:offsets[i + 1]]. Target properties used
+# by the dependency lists are bit flags, bound names and the other paths
+# are interned in a table.
+#
+# Dependency lists of build.ninja are computed over the arrays as path ids
+# appended to one array, targets only keep their positions there.
+# Nothing changes targets after the graph is built but the removal of
+# circular includes, which rebuilds the includes arrays.
+#
+
+from array import array
+from itertools import accumulate
+
+from jamp.classes import State, Target
+from jamp.paths import check_vms, escape_path
+
+# target flags
+NOTFILE = 1
+NOCARE = 2
+NOUPDATE = 4
+SEARCHABLE = 8
+DIR = 16
+DIRS_TARGET = 32
+BUILT = 64
+LOCATED = 128
+LINKED = 256
+
+# includes deeper than that are not followed
+MAX_LEVEL = 10
+
+
+def target_flags(state: State, target: Target) -> int:
+    flags = 0
+    if target.notfile:
+        flags |= NOTFILE
+    if target.nocare:
+        flags |= NOCARE
+    if target.noupdate:
+        flags |= NOUPDATE
+    if not target.not_searchable():
+        flags |= SEARCHABLE
+    if target.boundname and target.check_if_dir():
+        flags |= DIR
+    if target.is_dirs_target:
+        flags |= DIRS_TARGET
+    if target.build_step is not None:
+        flags |= BUILT
+    if target.boundname and target.boundname in state.target_locations:
+        flags |= LOCATED
+    if target.depends or target.includes:
+        flags |= LINKED
+
+    return flags
+
+
+def adjacency(targets: list[Target], attr: str) -> tuple[array, array]:
+    """Offsets and edges of depends or includes of the targets"""
+
+    rows = [getattr(target, attr) for target in targets]
+    offsets = array("q", [0])
+    offsets.extend(accumulate(map(len, rows)))
+    edges = array("i", [t.id for row in rows for t in row])
+    return offsets, edges
+
+
+class TargetGraph:
+    def __init__(self, state: State):
+        self.state = state
+        self.vms = check_vms()
+        # targets by ids
+        self.targets: list[Target] = list(state.targets.values())
+
+        self.depends = adjacency(self.targets, "depends")
+        self.includes = adjacency(self.targets, "includes")
+
+        self.flags = array("H", [target_flags(state, t) for t in self.targets])
+
+        # interned paths: bound names, names of phony targets and collections
+        values = [t.name if t.notfile else t.boundname for t in self.targets]
+        self.paths: list[str] = list(dict.fromkeys(filter(None, values)))
+        self.path_ids: dict[str, int] = {p: pid for pid, p in enumerate(self.paths)}
+
+        # the path of the target in dependency lists, -1 if it has none
+        path_ids = self.path_ids
+        self.value = array("i", [path_ids[v] if v else -1 for v in values])
+        self.dirs_path = self.intern("dirs")
+        self.unwrap = {
+            state.targets[name].id
+            for name in state.unwrap_phony or ()
+            if name in state.targets
+        }
+
+        # dependency lists: implicit count, order-only count, implicit path ids,
+        # order-only path ids. The empty list is at 0.
+        self.lists = array("i", [0, 0])
+
+        # positions of the dependency lists of the targets, and of the phony
+        # targets collecting an include with its own includes
+        count = len(self.targets)
+        self.deps = array("q", [-1]) * count
+        self.collections = array("q", [-1]) * count
+        self.collection_names = array("i", [-1]) * count
+
+    def intern(self, path: str | None) -> int:
+        if not path:
+            return -1
+
+        pid = self.path_ids.get(path)
+        if pid is None:
+            pid = self.path_ids[path] = len(self.paths)
+            self.paths.append(path)
+
+        return pid
+
+    def edges(self, adjacency: tuple[array, array], i: int) -> array:
+        offsets, edges = adjacency
+        return edges[offsets[i] : offsets[i + 1]]
+
+    def store(self, implicit, order_only) -> int:
+        """Appends a dependency list, returns its position"""
+
+        lists = self.lists
+        pos = len(lists)
+        lists.append(len(implicit))
+        lists.append(len(order_only))
+        lists.extend(implicit)
+        lists.extend(order_only)
+        return pos
+
+    def load(self, pos: int) -> tuple[array, array]:
+        lists = self.lists
+        start = pos + 2
+        mid = start + lists[pos]
+        return lists[start:mid], lists[mid : mid + lists[pos + 1]]
+
+    def collection(self, i: int) -> tuple[array, array]:
+        """Paths collected by the phony target of the include"""
+
+        return self.load(self.collections[i])
+
+    def dependencies(self, i: int, level=0, outputs=None):
+        """
+        Ninja level dependency list of the target: implicit and order-only path
+        ids. Includes having their own includes are replaced by collections,
+        unless the list is for a build step with several outputs.
+        """
+
+        use_cached = outputs is None or len(outputs) == 1
+
+        if level == MAX_LEVEL:
+            # do not go too deep for includes
+            return (), ()
+
+        if use_cached and self.deps[i] >= 0:
+            return self.load(self.deps[i])
+
+        flags, value = self.flags, self.value
+        state = self.state
+        if not flags[i] & LINKED and not state.debug_deps:
+            self.deps[i] = 0
+            return (), ()
+
+        implicit, order_only = set(), set()
+        offsets, edges = self.depends
+        depends = edges[offsets[i] : offsets[i + 1]]
+
+        for t in depends:
+            dep_flags = flags[t]
+            depval = -1
+
+            if dep_flags & NOTFILE:
+                if t in self.unwrap:
+                    phony_deps_impl, phony_deps_order = self.dependencies(t)
+                    implicit.update(phony_deps_impl)
+                    order_only.update(phony_deps_order)
+                else:
+                    depval = value[t]
+            elif dep_flags & NOCARE and not dep_flags & SEARCHABLE:
+                continue
+            elif value[t] >= 0:
+                if not flags[i] & DIRS_TARGET and dep_flags & DIR:
+                    implicit.add(self.dirs_path)
+                    continue
+
+                depval = value[t]
+
+            if depval >= 0:
+                if outputs is not None and depval in outputs:
+                    continue
+                elif dep_flags & NOUPDATE:
+                    order_only.add(depval)
+                else:
+                    implicit.add(depval)
+
+        if not flags[i] & NOTFILE:
+            offsets, edges = self.includes
+            collections = self.collections
+            for t in edges[offsets[i] : offsets[i + 1]]:
+                if use_cached and collections[t] >= 0:
+                    implicit.add(self.collection_names[t])
+                    continue
+
+                inc_flags = flags[t]
+                if inc_flags & NOTFILE or inc_flags & LOCATED:
+                    depval = value[t]
+                else:
+                    continue
+
+                if depval < 0 or outputs and depval in outputs:
+                    continue
+
+                if inc_flags & LINKED:
+                    inner_deps_impl, inner_deps_order = self.dependencies(
+                        t, level=level + 1, outputs=outputs
+                    )
+
+                    if not use_cached:
+                        implicit.update(inner_deps_impl)
+                        order_only.update(inner_deps_order)
+                    elif len(inner_deps_impl) or len(inner_deps_order):
+                        collections[t] = self.store(
+                            {depval, *inner_deps_impl}, inner_deps_order
+                        )
+                        depval = self.intern(self.targets[t].collection_name())
+                        self.collection_names[t] = depval
+
+                if inc_flags & NOUPDATE:
+                    order_only.add(depval)
+                else:
+                    implicit.add(depval)
+
+            # collect dependencies from sources which are not built
+            for t in depends:
+                if not flags[t] & (NOTFILE | BUILT):
+                    built_deps_impl, built_deps_order = self.dependencies(
+                        t, outputs=outputs
+                    )
+                    implicit.update(built_deps_impl)
+                    order_only.update(built_deps_order)
+
+        if state.debug_deps:
+            name = self.targets[i].name
+            if state.limit_target is None or state.limit_target in name:
+                print(name, self.path_set(implicit), self.path_set(order_only))
+
+        if not use_cached:
+            return implicit, order_only
+
+        self.deps[i] = self.store(implicit, order_only) if implicit or order_only else 0
+        return implicit, order_only
+
+    def path_set(self, pids) -> set[str]:
+        return {self.paths[pid] for pid in pids}
+
+    def path_list(self, pids) -> list[str]:
+        """Paths of the ids, lowercase on VMS"""
+
+        paths = self.paths
+        if self.vms:
+            return list(dict.fromkeys(paths[pid].lower() for pid in pids))
+
+        return [paths[pid] for pid in pids]
+
+    def names(self, pids) -> list[str]:
+        """Escaped paths of the ids"""
+
+        paths = self.paths
+        if self.vms:
+            return list(dict.fromkeys(escape_path(paths[pid]) for pid in pids))
+
+        return [paths[pid] for pid in pids]
+
+    def remove_cycles(self, roots: list[Target], verbose=False):
+        """
+        Removes includes leading back to a target whose includes are being
+        followed, for the targets reachable from the roots
+        """
+
+        count = len(self.targets)
+        reached = bytearray(count)
+        stack = [root.id for root in roots]
+        for i in stack:
+            reached[i] = 1
+
+        while stack:
+            i = stack.pop()
+            for edges in (self.includes, self.depends):
+                for t in self.edges(edges, i):
+                    if not reached[t]:
+                        reached[t] = 1
+                        stack.append(t)
+
+        # depth-first search over includes: 1 while the target is on the
+        # stack, 2 when it's done
+        marks = bytearray(count)
+        offsets, edges = self.includes
+        removed = []
+
+        for start in range(count):
+            if not reached[start] or marks[start]:
+                continue
+
+            marks[start] = 1
+            stack = [(start, offsets[start])]
+            while stack:
+                i, pos = stack[-1]
+                if pos == offsets[i + 1]:
+                    marks[i] = 2
+                    stack.pop()
+                    continue
+
+                stack[-1] = (i, pos + 1)
+                t = edges[pos]
+                if marks[t] == 1:
+                    removed.append((i, t))
+                elif not marks[t]:
+                    marks[t] = 1
+                    stack.append((t, offsets[t]))
+
+        if not removed:
+            return
+
+        targets = self.targets
+        for i, t in removed:
+            targets[i].includes.discard(targets[t])
+            if verbose:
+                print(f"removed circular dependency: {targets[t]} from {targets[i]}")
+
+        self.includes = adjacency(targets, "includes")
+        for i, _ in removed:
+            self.flags[i] = target_flags(self.state, targets[i])
@@ -92,7 +92,7 @@ def get_cached_headers(state, fn: str, timestamp: float):
 
 
 def target_find_headers(state, target, db: dict | None = None) -> bool:
-    from jamp.executors import exec_one_rule
+    from jamp.executors import exec_one_rule, rule_dispatcher
 
     before_incs = len(target.includes)
 
@@ -146,7 +146,10 @@ def target_find_headers(state, target, db: dict | None = None) -> bool:
 
         with target.overlay(state):
             for rule_name in hdrrule:
-                exec_one_rule(state, rule_name, lol)
+                if state.trace_on:
+                    exec_one_rule.traced(state, rule_name, lol)
+                else:
+                    rule_dispatcher(state, rule_name)(state, lol)
 
     if before_incs != len(target.includes):
         change_pairs = []
@@ -1,12 +1,13 @@
+import functools
 import os
 import re
 import subprocess as sp
 import sys
-from pathlib import Path
+from collections.abc import Callable
 
 from jamp.classes import State, Target
-from jamp.expand import expand, lol_get
-from jamp.pattern import match
+from jamp.expand import expand, lol_get, var_expand
+from jamp.pattern import compile_regex, filter_matching
 
 
 def output(text, end="\n"):
@@ -38,17 +39,15 @@ class Builtins:
         if len(patterns) == 0 or len(dirs) == 0:
             return []
 
+        state.side_effects += 1
+
         res = []
         for d in dirs:
-            p = Path(d)
-            if not p.is_dir():
+            names = state.dir_index.listing(d)
+            if names is None:
                 continue
 
-            for f in p.iterdir():
-                for m in patterns:
-                    if match(m, f.name) == 0:
-                        res.append(os.path.join(d, f.name))
-                        break
+            res += [os.path.join(d, name) for name in filter_matching(patterns, names)]
 
         return Result(res)
 
@@ -106,10 +105,12 @@ class Builtins:
             print("jamp: Match rule works by Python regular expression rules")
             self.match_complained = True
 
+        regexes = [compile_regex(p).findall for p in patterns]
+
         res = []
         for s in strings:
-            for p in patterns:
-                matches = re.findall(p, s)
+            for findall in regexes:
+                matches = findall(s)
                 if not matches:
                     continue
 
@@ -124,6 +125,64 @@ class Builtins:
 
         return Result(res)
 
+    def sort(self, state: State, lol: list):
+        from jamp.executors import Result
+
+        return Result(sorted(lol_get(lol, 0)))
+
+    def unique(self, state: State, lol: list):
+        """
+        Removes duplicates, the first occurrences are kept in order.
+        Items of the optional second list are removed too.
+        """
+        from jamp.executors import Result
+
+        res = dict.fromkeys(lol_get(lol, 0))
+        for item in lol_get(lol, 1):
+            res.pop(item, None)
+
+        return Result(list(res))
+
+    def length(self, state: State, lol: list):
+        from jamp.executors import Result
+
+        return Result([str(len(lol_get(lol, 0)))])
+
+    def split(self, state: State, lol: list):
+        """Splits strings by any of the separator characters, drops empty parts"""
+        from jamp.executors import Result
+
+        strings = lol_get(lol, 0)
+        separators = "".join(lol_get(lol, 1))
+        if not separators:
+            return Result([s for s in strings if s])
+
+        split = compile_regex(f"[{re.escape(separators)}]").split
+        return Result([part for s in strings for part in split(s) if part])
+
+    # Boost.Jam name
+    split_by_characters = split
+
+    def subst(self, state: State, lol: list):
+        """Replaces matches of the regular expression in every string"""
+        from jamp.executors import Result
+
+        strings = lol_get(lol, 0)
+        patterns = lol_get(lol, 1)
+        if not patterns:
+            return Result(strings)
+
+        replacement = " ".join(lol_get(lol, 2))
+        sub = compile_regex(patterns[0]).sub
+        return Result([sub(replacement, s) for s in strings])
+
+    def memoize(self, state: State, lol: list):
+        """Calls of the rules are memoized even if they don't look pure"""
+
+        for name in lol_get(lol, 0):
+            state.memoized_rules.add(name)
+            state.rule_dispatch.pop(name, None)
+
     def depends(self, state: State, lol: list, includes=False):
         """
         Depends() - DEPENDS/INCLUDES rule
@@ -189,6 +248,7 @@ class Builtins:
         """Register header-name macros defined by the supplied files."""
         from jamp.headers import scan_header_macros
 
+        state.side_effects += 1
         for path in expand(state, paths_arg):
             target = Target.bind(state, path)
             target.bind_location(state)
@@ -235,6 +295,7 @@ class Builtins:
         return first
 
     def echo(self, state: State, params: list):
+        state.side_effects += 1
         self._print(params)
         output("")
 
@@ -251,6 +312,7 @@ class Builtins:
         from jamp.executors import Result
 
         cmd = " ".join(expand(state, args))
+        state.side_effects += 1
         output = ""
         try:
             output = sp.check_output(cmd, shell=True)
@@ -264,6 +326,8 @@ class Builtins:
                     "non-zero status (use --verbose for more info)"
                 )
                 self.nonzero_complained = True
+        finally:
+            state.files_changed()
 
         return Result([output])
 
@@ -287,8 +351,354 @@ class Builtins:
         print()
 
 
+def is_true(value: list) -> bool:
+    """Value of a list in a condition"""
+
+    return len(value) > 0 and len(value[0]) > 0
+
+
+def call_rule_by_name(state: State, name: str, lol: list) -> list:
+    """Result of `[ name lol ]`"""
+
+    from jamp.executors import Result, rule_dispatcher
+
+    res = rule_dispatcher(state, name)(state, lol)
+    return res.val if isinstance(res, Result) else []
+
+
+# Python versions of Jambase utility rules, see NATIVE_RULES
+
+
+def native_fgrist(state: State, lol: list):
+    from jamp.executors import Result
+
+    return Result(var_expand("$(<:J=!)", lol, state.vars))
+
+
+def native_fgristfiles(state: State, lol: list):
+    from jamp.executors import Result
+
+    return Result(var_expand("$(<:G=$(SOURCE_GRIST:E))", lol, state.vars))
+
+
+def native_fgristsourcefiles(state: State, lol: list):
+    from jamp.executors import Result
+
+    files = lol_get(lol, 0)
+    if not is_true(var_expand("$(SOURCE_GRIST)", None, state.vars)):
+        return Result(files)
+
+    res = []
+    for f in files:
+        if f.endswith(".h"):
+            res.append(f)
+        else:
+            res += var_expand("$(1:G=$(SOURCE_GRIST))", [[f]], state.vars)
+
+    return Result(res)
+
+
+def native_freverse(state: State, lol: list):
+    from jamp.executors import Result
+
+    res = []
+    for item in lol_get(lol, 0):
+        if not item:
+            break
+
+        res.append(item)
+
+    res.reverse()
+    return Result(res)
+
+
+def native_fsubdir(state: State, lol: list):
+    from jamp.executors import Result
+
+    dirs = lol_get(lol, 0)
+    if not is_true(dirs[:1]):
+        return Result(var_expand("$(DOT)", None, state.vars))
+
+    res = var_expand("$(DOTDOT)", None, state.vars)
+    for _ in dirs[1:]:
+        res = var_expand("$(1:R=$(DOTDOT))", [res], state.vars)
+
+    return Result(res)
+
+
+def native_fstripcommon(state: State, lol: list):
+    def values(names: list, first: bool):
+        res = []
+        for name in names:
+            value = state.vars.lookup(name)
+            if isinstance(value, str):
+                value = [value]
+
+            res += value[:1] if first else value[1:]
+
+        return res
+
+    left = lol_get(lol, 0)
+    right = lol_get(lol, 1)
+
+    while True:
+        first = values(left, True)
+        if not is_true(first) or first != values(right, True):
+            return
+
+        for name in left:
+            state.vars.set(name, values(left, False))
+        for name in right:
+            state.vars.set(name, values(right, False))
+
+
+def native_frelpath(state: State, lol: list):
+    from jamp.executors import Result
+
+    state.vars.push()
+    try:
+        state.vars.set_local("_l", list(lol_get(lol, 0)))
+        state.vars.set_local("_r", list(lol_get(lol, 1)))
+        call_rule_by_name(state, "FStripCommon", [["_l"], ["_r"]])
+
+        left = call_rule_by_name(state, "FSubDir", [state.vars.get("_l")])
+        right = call_rule_by_name(state, "FDirName", [state.vars.get("_r")])
+    finally:
+        state.vars.pop()
+
+    if right == var_expand("$(DOT)", None, state.vars):
+        return Result(left)
+
+    return Result(var_expand("$(2:R=$(1))", [left, right], state.vars))
+
+
+def native_fappendsuffix(state: State, lol: list):
+    from jamp.executors import Result
+
+    files = lol_get(lol, 0)
+    suffixes = lol_get(lol, 1)
+    if not is_true(suffixes):
+        return Result(files)
+
+    res = []
+    for f in files:
+        if is_true(var_expand("$(1:S)", [[f]], state.vars)):
+            res.append(f)
+        else:
+            res += var_expand("$(1:S=$(2))", [[f], suffixes], state.vars)
+
+    return Result(res)
+
+
+def native_fquote(state: State, lol: list):
+    from jamp.executors import Result
+
+    return Result(['\\"' + item + '\\"' for item in lol_get(lol, 0)])
+
+
+def native_fdefines(state: State, lol: list):
+    from jamp.executors import Result
+
+    return Result(["-D" + item for item in lol_get(lol, 0)])
+
+
+def native_fincludes(state: State, lol: list):
+    from jamp.executors import Result
+
+    return Result(["-I" + item for item in lol_get(lol, 0)])
+
+
+def native_fdirname(state: State, lol: list):
+    from jamp.executors import Result
+
+    res = var_expand("$(DOT)", None, state.vars)
+    for item in lol_get(lol, 0):
+        res = var_expand("$(1:R=$(2))", [[item], res], state.vars)
+
+    return Result(res)
+
+
+# Jambase rules with Python versions (the functions above). They are used only
+# if the rule is defined exactly as here, so redefined rules and platform
+# variants are interpreted as usual.
+NATIVE_RULES = {
+    "FGrist": (native_fgrist, "rule FGrist { return $(<:J=!) ; }"),
+    "FGristFiles": (
+        native_fgristfiles,
+        "rule FGristFiles { return $(<:G=$(SOURCE_GRIST:E)) ; }",
+    ),
+    "FGristSourceFiles": (
+        native_fgristsourcefiles,
+        """
+        rule FGristSourceFiles
+        {
+            if ! $(SOURCE_GRIST)
+            {
+                return $(<) ;
+            }
+            else
+            {
+                local _i _o ;
+
+                for _i in $(<)
+                {
+                switch $(_i)
+                {
+                case *.h :  _o += $(_i) ;
+                case * :    _o += $(_i:G=$(SOURCE_GRIST)) ;
+                }
+                }
+
+                return $(_o) ;
+            }
+        }
+        """,
+    ),
+    "FReverse": (
+        native_freverse,
+        "rule FReverse { if $(1) { return [ FReverse $(1[2-]) ] $(1[1]) ; } }",
+    ),
+    "FSubDir": (
+        native_fsubdir,
+        """
+        rule FSubDir
+        {
+            if ! $(<[1])
+            {
+                return $(DOT) ;
+            }
+            else
+            {
+                local _i _d ;
+
+                _d = $(DOTDOT) ;
+
+                for _i in $(<[2-])
+                {
+                _d = $(_d:R=$(DOTDOT)) ;
+                }
+
+                return $(_d) ;
+            }
+        }
+        """,
+    ),
+    "FStripCommon": (
+        native_fstripcommon,
+        """
+        rule FStripCommon
+        {
+            if $($(<)[1]) && $($(<)[1]) = $($(>)[1])
+            {
+                $(<) = $($(<)[2-]) ;
+                $(>) = $($(>)[2-]) ;
+                FStripCommon $(<) : $(>) ;
+            }
+        }
+        """,
+    ),
+    "FRelPath": (
+        native_frelpath,
+        """
+        rule FRelPath
+        {
+            local _l _r ;
+
+            _l = $(<) ;
+            _r = $(>) ;
+
+            FStripCommon _l : _r ;
+
+            _l = [ FSubDir $(_l) ] ;
+            _r = [ FDirName $(_r) ] ;
+
+            if $(_r) = $(DOT) {
+                return $(_l) ;
+            } else {
+                return $(_r:R=$(_l)) ;
+            }
+        }
+        """,
+    ),
+    "FAppendSuffix": (
+        native_fappendsuffix,
+        """
+        rule FAppendSuffix
+        {
+            if $(>)
+            {
+                local _i _o ;
+
+                for _i in $(<)
+                {
+                if $(_i:S)
+                {
+                    _o += $(_i) ;
+                }
+                else
+                {
+                    _o += $(_i:S=$(>)) ;
+                }
+                }
+                return $(_o) ;
+            }
+            else
+            {
+                return $(<) ;
+            }
+        }
+        """,
+    ),
+    "FQuote": (native_fquote, r'rule FQuote { return "\\\"$(<)\\\"" ; }'),
+    "FDefines": (native_fdefines, "rule FDefines { return -D$(<) ; }"),
+    "FIncludes": (native_fincludes, "rule FIncludes { return -I$(<) ; }"),
+    "FDirName": (
+        native_fdirname,
+        """
+        rule FDirName
+        {
+            local _i ;
+            local _s = $(DOT) ;
+
+            for _i in $(<)
+            {
+                _s = $(_i:R=$(_s)) ;
+            }
+
+            return $(_s) ;
+        }
+        """,
+    ),
+}
+
+
+@functools.cache
+def native_block(name: str):
+    from jamp.jam_syntax import parse
+
+    return parse(NATIVE_RULES[name][1])[0][3]
+
+
+def native_rule(name: str, block) -> Callable | None:
+    """Function doing the same as the rule, if there is one"""
+
+    from jamp.jam_syntax import same_ast
+
+    if name in NATIVE_RULES and same_ast(block, native_block(name)):
+        return NATIVE_RULES[name][0]
+
+    return None
+
+
 def trace(name: str, len_args=None):
+    """
+    Adds a tracing variant of the executor as `func.traced`. The function
+    itself is left as is, the variant is chosen on compilation when
+    tracing is on (see traced()), so normal runs don't pay for it.
+    """
+
     def inner1(func):
+        # not wrapped, traces print the compiled calls as F:inner
         def inner(state: State, *args, **kwargs):
             args_to_print = args if len_args is None else args[:len_args]
 
@@ -301,11 +711,21 @@ def trace(name: str, len_args=None):
 
             return res
 
-        return inner
+        func.traced = inner
+        return func
 
     return inner1
 
 
+def traced(state: State, func):
+    """Returns the tracing variant of the executor if tracing is on"""
+
+    if state.trace_on:
+        return getattr(func, "traced", func)
+
+    return func
+
+
 def traceinfo(text):
     if not Builtins.traceback:
         return
@@ -1,3 +1,5 @@
+import re
+
 keywords = {
     "<": "LANGLE",
     "<=": "LANGLE_EQUALS",
@@ -53,6 +55,16 @@ EOF = -1
 EOL = "\n"
 WHITESPACE = " \t\n\f\r"
 
+# Whitespace and comments (a comment starts only at a token start) followed
+# by a word: everything up to unquoted whitespace, backslash protects the
+# next character (inside the quotes too).
+TOKEN_RE = re.compile(
+    r"(?:[ \t\n\f\r]+|#[^\n]*\n?)*"
+    r'((?:[^ \t\n\f\r"\\]+|"(?:[^"\\]|\\[\s\S])*"|\\[\s\S])*)'
+)
+UNQUOTE_RE = re.compile(r'\\([\s\S])|"')
+BRACES_RE = re.compile(r"[{}]")
+
 
 class LexerError(Exception):
     pass
@@ -64,6 +76,12 @@ class LexerToken:
 
 
 class Lexer:
+    """
+    Splits the whole input buffer with compiled regular expressions.
+    Gives the same tokens (including lineno and lexpos) as CharLexer,
+    the original character-at-a-time implementation.
+    """
+
     def __init__(self, filename=None):
         self.restart()
         self.text = ""
@@ -76,6 +94,159 @@ class Lexer:
     def input(self, text: str):
         self.text = text
 
+    def current_lineno(self):
+        return self.lineno + 1
+
+    def advance(self, start: int, end: int, lookahead: int):
+        """Move to end, lexpos restarts if a newline was seen up to lookahead"""
+
+        text = self.text
+        self.lineno += text.count(EOL, start, end)
+        if text.find(EOL, start, lookahead) != -1:
+            self.lexpos = 1
+
+        self.pos = end
+
+    def get_string(self):
+        # If scanning for a string (action's {}'s), look for the
+        # closing brace.  We handle matching braces, if they match!
+        nest = 1
+        start = self.pos
+        end = -1
+
+        for m in BRACES_RE.finditer(self.text, start):
+            if m.group() == "{":
+                nest += 1
+            else:
+                nest -= 1
+                if nest == 0:
+                    end = m.start()
+                    break
+
+        if end == -1:
+            raise LexerError("unmatched {} in action block")
+
+        # the ending brace is left for the next token
+        self.advance(start, end, end)
+
+        tok = LexerToken()
+        tok.type = "STRING"
+        tok.value = self.text[start:end]
+
+        return self.next_token(tok)
+
+    def next_token(self, tok=None):
+        if tok is None:
+            self.finished = True
+            return None
+
+        tok.lexpos = self.lexpos
+        tok.lexer = self
+        tok.lineno = self.lineno + 1
+        self.lexpos += 1
+
+        if tok.type == "ACTIONS":
+            self.actions_block = True
+
+        if self.actions_block:
+            if tok.type == "LBRACE":
+                self.set_scanmode(SCAN_STRING)
+
+            if tok.type == "STRING":
+                self.set_scanmode(SCAN_NORMAL)
+                self.actions_block = False
+
+        self.prevtoken = tok
+        return tok
+
+    def restart(self):
+        self.scanmode = SCAN_NORMAL
+
+        self.pos = 0
+        self.finished = False
+        self.lineno = 0
+        self.lexpos = 1
+        self.prevpos = self.pos
+        self.prevlineno = self.lineno
+        self.actions_block = False
+
+    def token(self):
+        if self.finished:
+            return None
+
+        if self.scanmode == SCAN_STRING:
+            return self.get_string()
+
+        text = self.text
+        size = len(text)
+        start = self.pos
+        m = TOKEN_RE.match(text, start)
+        begin, end = m.span(1)
+
+        if begin >= size:
+            self.advance(start, size, size)
+
+            # a comment without newline at the end still counts as a line
+            last_line = text.rfind(EOL, start, size) + 1
+            if text.find("#", max(start, last_line), size) != -1:
+                self.lineno += 1
+                self.lexpos = 1
+
+            return self.next_token()
+
+        raw_end = end
+
+        if end < size and text[end] not in WHITESPACE:
+            # the word regex stops only on a quote without a pair or
+            # on a backslash at the very end of input
+            if text[end] == '"':
+                raise LexerError('unmatched " in string')
+
+            end = size
+
+        # the character after the word was looked at too
+        self.lineno += text.count(EOL, start, end)
+        if text.find(EOL, start, end + 1) != -1:
+            self.lexpos = 1
+
+        self.pos = end
+
+        res = text[begin:raw_end]
+        notkeyword = text[begin] == "$"
+
+        # Quotes are stripped but preserve their whitespace; backslash
+        # protects the following character.
+        if '"' in res or "\\" in res:
+            res = UNQUOTE_RE.sub(lambda m: m.group(1) or "", res)
+            notkeyword = True
+
+        tok = LexerToken()
+        tok.type = "ARG"
+        tok.value = res
+
+        if (
+            not notkeyword
+            and res
+            and not (res[0].isalpha() and self.scanmode == SCAN_PUNCT)
+        ):
+            if res in keywords:
+                tok.type = keywords[res]
+
+            if tok.type == "INCLUDE" and not (
+                self.prevtoken is None
+                or self.prevtoken.type in ("SEMICOLON", "LBRACE", "RBRACE")
+            ):
+                tok.type = "ARG"
+
+        return self.next_token(tok)
+
+
+class CharLexer(Lexer):
+    """
+    The original lexer which walks the input one character at a time,
+    kept as the reference implementation for tests and benchmarks.
+    """
+
     def nextline(self):
         """Skip the remainder of the current line (used for comments)."""
         next_newline = self.text.find(EOL, self.pos)
@@ -92,9 +263,6 @@ class Lexer:
         self.pos = self.prevpos
         self.lineno = self.prevlineno
 
-    def current_lineno(self):
-        return self.lineno + 1
-
     def getchar(self):
         if self.pos >= len(self.text):
             return EOF
@@ -141,41 +309,6 @@ class Lexer:
 
         return self.next_token(tok)
 
-    def next_token(self, tok=None):
-        if tok is None:
-            self.finished = True
-            return None
-
-        tok.lexpos = self.lexpos
-        tok.lexer = self
-        tok.lineno = self.lineno + 1
-        self.lexpos += 1
-
-        if tok.type == "ACTIONS":
-            self.actions_block = True
-
-        if self.actions_block:
-            if tok.type == "LBRACE":
-                self.set_scanmode(SCAN_STRING)
-
-            if tok.type == "STRING":
-                self.set_scanmode(SCAN_NORMAL)
-                self.actions_block = False
-
-        self.prevtoken = tok
-        return tok
-
-    def restart(self):
-        self.scanmode = SCAN_NORMAL
-
-        self.pos = 0
-        self.finished = False
-        self.lineno = 0
-        self.lexpos = 1
-        self.prevpos = self.pos
-        self.prevlineno = self.lineno
-        self.actions_block = False
-
     def token(self):
         inquote = False
 
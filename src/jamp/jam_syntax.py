@@ -1,12 +1,20 @@
 #!/usr/bin/env python3
 
+import hashlib
 import sys
 from enum import Enum
+from functools import cache
 
-from jamp.jam_lexer import SCAN_NORMAL, Lexer, keywords
+from jamp import jam_lexer
+from jamp.cache import cache_file, load_pickle, save_pickle
+from jamp.jam_lexer import SCAN_NORMAL, Lexer, LexerError, keywords
 from jamp.yacc import yacc
 
 use_colors = False
+PARSETAB_NAME = "parsetab.pickle"
+
+# incremented by p_error, parse results with errors are not cached
+syntax_errors = 0
 
 if not hasattr(sys, "_called_from_test"):
     try:
@@ -439,6 +447,9 @@ def p_bindlist(p):
 
 
 def p_error(p):
+    global syntax_errors
+
+    syntax_errors += 1
     parts = []
     if not p:
         print("Error, but no info, check Jamfile for correct EOF")
@@ -456,23 +467,459 @@ def p_error(p):
         print("Syntax error")
 
 
+class ParseError(Exception):
+    pass
+
+
+# tokens which can start a rule (statement)
+RULE_START = {
+    "LBRACE",
+    "INCLUDE",
+    "BREAK",
+    "CONTINUE",
+    "RETURN",
+    "FOR",
+    "SWITCH",
+    "IF",
+    "WHILE",
+    "RULE",
+    "ON",
+    "ACTIONS",
+    "LOCAL",
+    "ARG",
+    "LBRACKET",
+}
+
+ASSIGN_TYPES = {"EQUALS", "PLUS_EQUALS", "QUESTION_EQUALS"}
+EFLAGS = {"UPDATED", "TOGETHER", "IGNORE", "QUIETLY", "PIECEMEAL", "EXISTING"}
+
+# same as in the precedence table, all binary operators are left associative
+BINARY_PRECEDENCE = {
+    "BARBAR": 1,
+    "BAR": 1,
+    "AMPERAMPER": 2,
+    "AMPER": 2,
+    "EQUALS": 3,
+    "BANG_EQUALS": 3,
+    "LANGLE": 4,
+    "LANGLE_EQUALS": 4,
+    "RANGLE": 4,
+    "RANGLE_EQUALS": 4,
+}
+
+
+class Parser:
+    """
+    Recursive-descent parser for the grammar above. Builds exactly the same
+    AST as the p_* functions, but without the generic LR machinery.
+    Raises ParseError on any syntax error, the PLY parser is used then
+    to report the error.
+    """
+
+    def __init__(self, lexer: Lexer):
+        self.lexer = lexer
+        self.rules = {
+            "LBRACE": self.rule_block,
+            "INCLUDE": self.rule_include,
+            "BREAK": self.rule_break,
+            "CONTINUE": self.rule_continue,
+            "RETURN": self.rule_return,
+            "FOR": self.rule_for,
+            "SWITCH": self.rule_switch,
+            "IF": self.rule_if,
+            "WHILE": self.rule_while,
+            "RULE": self.ruledef,
+            "ON": self.rule_on_target,
+            "ACTIONS": self.rule_actions,
+            "LOCAL": self.rule_local,
+            "ARG": self.rule_arg,
+            "LBRACKET": self.rule_arg,
+        }
+        self.advance()
+
+    def advance(self):
+        tok = self.lexer.token()
+        self.tok = tok
+        self.type = tok.type if tok is not None else "$end"
+
+    def error(self):
+        value = self.tok.value if self.tok is not None else "EOF"
+        return ParseError(f"unexpected {value!r} at line {self.lexer.current_lineno()}")
+
+    def expect(self, tok_type: str):
+        if self.type != tok_type:
+            raise self.error()
+
+        value = self.tok.value
+        self.advance()
+        return value
+
+    def parse(self):
+        res = self.block()
+        if self.type != "$end":
+            raise self.error()
+
+        return res
+
+    def block(self):
+        res = None
+        rules = self.rules
+        while self.type in rules:
+            if res is None:
+                res = []
+
+            res.append(rules[self.type]())
+
+        return res
+
+    def rule(self):
+        rule_parser = self.rules.get(self.type)
+        if rule_parser is None:
+            raise self.error()
+
+        return rule_parser()
+
+    def rule_block(self):
+        self.advance()
+        block = self.block()
+        self.expect("RBRACE")
+        return block
+
+    def rule_include(self):
+        self.advance()
+        items = self.list()
+        self.expect("SEMICOLON")
+        return (Node.INCLUDE, items)
+
+    def rule_break(self):
+        self.advance()
+        items = self.list()
+        self.expect("SEMICOLON")
+        return (Node.BREAK, items)
+
+    def rule_continue(self):
+        self.advance()
+        items = self.list()
+        self.expect("SEMICOLON")
+        return (Node.CONTINUE, items)
+
+    def rule_return(self):
+        self.advance()
+        items = self.list()
+        self.expect("SEMICOLON")
+        return (Node.RETURN, items)
+
+    def rule_for(self):
+        self.advance()
+        varname = self.expect("ARG")
+        self.expect("IN")
+        items = self.list()
+        self.expect("LBRACE")
+        block = self.block()
+        self.expect("RBRACE")
+        return (Node.FOR, varname, items, block)
+
+    def rule_switch(self):
+        self.advance()
+        items = self.list()
+        self.expect("LBRACE")
+
+        cases = []
+        while self.type == "CASE":
+            self.advance()
+            pattern = self.expect("ARG")
+            self.expect("COLON")
+            cases.append((Node.CASE, pattern, self.block()))
+
+        self.expect("RBRACE")
+        return (Node.SWITCH, items, cases)
+
+    def rule_if(self):
+        self.advance()
+        cond = self.expr()
+        self.expect("LBRACE")
+        block = self.block()
+        self.expect("RBRACE")
+
+        if self.type != "ELSE":
+            return (Node.IF, cond, block)
+
+        self.advance()
+        return (Node.IF, cond, block, self.rule())
+
+    def rule_while(self):
+        self.advance()
+        cond = self.expr()
+        self.expect("LBRACE")
+        block = self.block()
+        self.expect("RBRACE")
+        return (Node.WHILE, cond, block)
+
+    def ruledef(self):
+        self.advance()
+        name = self.expect("ARG")
+        if self.type != "LBRACE":
+            # rule parameters are not supported by the AST
+            raise self.error()
+
+        self.advance()
+        block = self.block()
+        self.expect("RBRACE")
+        return (Node.RULE, name, None, block)
+
+    def rule_on_target(self):
+        self.advance()
+        target = self.arg()
+        return (Node.ON_TARGET, target, self.rule())
+
+    def rule_actions(self):
+        self.advance()
+
+        eflags = []
+        while True:
+            if self.type in EFLAGS:
+                eflags.append((Node.EFLAG, self.tok.value, None))
+                self.advance()
+            elif self.type == "MAXLINE":
+                flag = self.tok.value
+                self.advance()
+                eflags.append((Node.EFLAG, flag, self.expect("ARG")))
+            else:
+                break
+
+        name = self.expect("ARG")
+
+        if self.type == "BIND":
+            self.advance()
+            bindlist = (Node.BINDLIST, self.list())
+        else:
+            bindlist = (Node.BINDLIST, None)
+
+        self.expect("LBRACE")
+        script = self.expect("STRING")
+        self.expect("RBRACE")
+        return (Node.ACTIONS, eflags, name, bindlist, script)
+
+    def rule_local(self):
+        self.advance()
+        names = self.list()
+        value = None
+        if self.type == "EQUALS":
+            self.advance()
+            value = self.list()
+
+        self.expect("SEMICOLON")
+        return (Node.LOCAL, names, value)
+
+    def rule_arg(self):
+        """Rule call, assignment or assignment on target"""
+
+        name = self.arg()
+        tok_type = self.type
+
+        if tok_type in ASSIGN_TYPES or tok_type == "DEFAULT":
+            assign_type = self.assign_type()
+            items = self.list()
+            self.expect("SEMICOLON")
+            return (Node.ASSIGN, name, assign_type, items)
+
+        if tok_type == "ON":
+            self.advance()
+            targets = self.list()
+            assign_type = self.assign_type()
+            items = self.list()
+            self.expect("SEMICOLON")
+            return (Node.ARG_ON_TARGET, name, targets, assign_type, items)
+
+        lol = self.lol()
+        self.expect("SEMICOLON")
+        return (Node.CALL, name, lol)
+
+    def assign_type(self):
+        tok_type = self.type
+        if tok_type in ASSIGN_TYPES:
+            value = self.tok.value
+            self.advance()
+            return value
+
+        value = self.expect("DEFAULT")
+        self.expect("EQUALS")
+        return value
+
+    def expr(self, min_precedence=1):
+        left = self.unary_expr()
+
+        while True:
+            precedence = BINARY_PRECEDENCE.get(self.type)
+            if precedence is None or precedence < min_precedence:
+                return left
+
+            op = self.tok.value
+            self.advance()
+            right = self.expr(precedence + 1)
+            left = (Node.EXPR_BOP, (left, op, right))
+
+    def unary_expr(self):
+        tok_type = self.type
+
+        if tok_type == "BANG":
+            op = self.tok.value
+            self.advance()
+            return (Node.EXPR_UNARY, op, self.unary_expr())
+
+        if tok_type == "LPAREN":
+            self.advance()
+            inner = self.expr()
+            self.expect("RPAREN")
+            return (Node.EXPR_BLOCK, inner)
+
+        left = self.arg()
+        if self.type == "IN":
+            op = self.tok.value
+            self.advance()
+            return (Node.EXPR_BOP, (left, op, self.list()))
+
+        return (Node.EXPR, left)
+
+    def lol(self):
+        res = [Node.LOL, self.list()]
+        while self.type == "COLON":
+            self.advance()
+            res.append(self.list())
+
+        return tuple(res)
+
+    def list(self):
+        res = None
+        while self.type == "ARG" or self.type == "LBRACKET":
+            if res is None:
+                res = []
+
+            res.append(self.arg())
+
+        return res
+
+    def arg(self):
+        if self.type == "ARG":
+            value = self.tok.value
+            self.advance()
+            return Arg(value)
+
+        if self.type != "LBRACKET":
+            raise self.error()
+
+        self.advance()
+        func = self.func()
+
+        if self.type != "RBRACKET":
+            raise self.error()
+
+        # the scan mode is reset before the next token is read
+        self.lexer.set_scanmode(SCAN_NORMAL)
+        self.advance()
+        return Arg(func)
+
+    def func(self):
+        if self.type != "ON":
+            name = self.arg()
+            return (Node.FUNC, name, self.lol())
+
+        self.advance()
+        targets = self.arg()
+
+        if self.type == "RETURN":
+            self.advance()
+            return (Node.RETURN_ON, targets, self.list())
+
+        name = self.arg()
+        return (Node.FUNC_ON, targets, name, self.lol())
+
+
 _parser = None
 
 
 def get_parser():
-    """Build the grammar once and reuse it for all Jamfiles in this run."""
+    """
+    Build the grammar once and reuse it for all Jamfiles in this run.
+    LALR tables are kept in the cache directory between runs, yacc checks
+    the grammar signature before using them.
+    """
     global _parser
     if _parser is None:
-        _parser = yacc()
+        _parser = yacc(picklefile=cache_file(PARSETAB_NAME))
     return _parser
 
 
-def parse(text: str, filename: str | None = None):
+def parse_ply(text: str, filename: str | None = None):
+    """Parse with the PLY LALR parser, the reference for Parser"""
     lexer = Lexer(filename=filename)
     lexer.input(text)
     return get_parser().parse(lexer=lexer)
 
 
+def same_ast(a, b) -> bool:
+    """Structural comparison of parsed code"""
+
+    if isinstance(a, Arg):
+        return isinstance(b, Arg) and same_ast(a.value, b.value)
+
+    if isinstance(a, (list, tuple)):
+        return (
+            type(a) is type(b)
+            and len(a) == len(b)
+            and all(same_ast(x, y) for x, y in zip(a, b))
+        )
+
+    return not isinstance(b, Arg) and a == b
+
+
+def parse(text: str, filename: str | None = None):
+    lexer = Lexer(filename=filename)
+    lexer.input(text)
+    try:
+        return Parser(lexer).parse()
+    except (ParseError, LexerError):
+        # let the PLY parser report the error (or raise the lexer error)
+        return parse_ply(text, filename=filename)
+
+
+@cache
+def parser_fingerprint():
+    """Identifies the jamp version and the lexer/parser code producing the AST"""
+    from jamp import __version__
+
+    h = hashlib.sha256(__version__.encode("utf-8"))
+    for fn in (jam_lexer.__file__, __file__):
+        with open(fn, "rb") as f:
+            h.update(f.read())
+
+    return h.hexdigest()
+
+
+def ast_cache_file(text: str):
+    h = hashlib.sha256(parser_fingerprint().encode("utf-8"))
+    h.update(text.encode("utf-8", "surrogateescape"))
+    return cache_file(f"ast-{h.hexdigest()}.pickle")
+
+
+def parse_cached(text: str, filename: str | None = None):
+    """
+    Same as parse() but the AST is kept in the cache directory, keyed by
+    the contents hash, so unchanged Jamfiles are not lexed and parsed again.
+    """
+    path = ast_cache_file(text)
+    cached = load_pickle(path)
+    if isinstance(cached, tuple) and len(cached) == 1:
+        return cached[0]
+
+    errors_before = syntax_errors
+    ast = parse(text, filename=filename)
+    if syntax_errors == errors_before:
+        save_pickle(path, (ast,))
+
+    return ast
+
+
 def parse_file(fn: str):
     with open(fn) as f:
         return parse(f.read(), filename=fn)
@@ -12,9 +12,11 @@
 
 import platform
 from enum import Enum
-from functools import cache
+from functools import cache, lru_cache
 from pathlib import PurePath
 
+PATHS_CACHE_SIZE = 8192
+
 
 @cache
 def check_vms():
@@ -31,20 +33,61 @@ def check_linux():
     return platform.system() == "Linux"
 
 
+def split_root(path: str) -> tuple[str, str]:
+    """Splits leading slashes, two of them are kept as PurePosixPath does"""
+
+    if path[:1] != "/":
+        return "", path
+
+    rest = path.lstrip("/")
+    return ("//" if len(path) - len(rest) == 2 else "/"), rest
+
+
+@lru_cache(maxsize=PATHS_CACHE_SIZE)
+def split_posix(path: str) -> tuple[str, str, str]:
+    """(parent, stem, suffix) of the path, same as PurePosixPath gives"""
+
+    root, rest = split_root(path)
+    parts = [part for part in rest.split("/") if part and part != "."]
+    if not parts:
+        return root or ".", "", ""
+
+    name = parts.pop()
+    idx = name.rfind(".")
+    if 0 < idx < len(name) - 1:
+        stem, suffix = name[:idx], name[idx:]
+    else:
+        stem, suffix = name, ""
+
+    return root + "/".join(parts) or ".", stem, suffix
+
+
+@lru_cache(maxsize=PATHS_CACHE_SIZE)
+def join_posix(*paths: str) -> str:
+    """str(PurePosixPath(*paths))"""
+
+    root = ""
+    parts = []
+    for path in paths:
+        if not path:
+            continue
+
+        path_root, rest = split_root(path)
+        if path_root:
+            root = path_root
+            parts = []
+
+        parts += [part for part in rest.split("/") if part and part != "."]
+
+    return root + "/".join(parts) or "."
+
+
 def escape_path(s):
     if check_vms():
         return s.replace("$", "$$").lower()
     return s
 
 
-def add_paths(s, deps):
-    if check_vms():
-        for dep in deps:
-            s.add(dep.lower())
-    else:
-        s.update(deps)
-
-
 class Dir(Enum):
     EMPTY = 0  # empty string */
     DEV = 1  # dev: */
@@ -85,6 +128,18 @@ class DirFlags:
 
 
 class Pathname:
+    __slots__ = (
+        "grist",
+        "root",
+        "directory",
+        "base",
+        "member",
+        "suffix",
+        "is_dir",
+        "parent",
+        "is_vms",
+    )
+
     def __init__(self, is_vms=None):
         self.grist = None
         self.root = None
@@ -140,6 +195,9 @@ class Pathname:
 
         if self.is_vms:
             self.parse_vms(string)
+        elif not check_windows():
+            self.directory, self.base, self.suffix = split_posix(string)
+            self.root = None
         else:
             path = PurePath(string)
             self.suffix = path.suffix
@@ -165,7 +223,13 @@ class Pathname:
         if self.is_vms:
             return self.build_vms(binding=binding)
 
-        is_abs = PurePath(self.directory).is_absolute()
+        if check_windows():
+            is_abs = PurePath(self.directory).is_absolute()
+            join = PurePath
+        else:
+            is_abs = self.directory.startswith("/")
+            join = join_posix
+
         fn = ""
         if self.base:
             fn = self.base + self.suffix
@@ -177,9 +241,9 @@ class Pathname:
 
         if self.root or self.directory or fn:
             if self.root and self.root != "." and not is_abs:
-                path = PurePath(self.root, self.directory, fn)
+                path = join(self.root, self.directory, fn)
             else:
-                path = PurePath(self.directory, fn)
+                path = join(self.directory, fn)
         else:
             path = ""
 
@@ -9,8 +9,139 @@
 # [a-z] any single character in the range a-z
 # [^a-z]    any single character not in the range a-z
 # \x    match x
+#
+# match() is the straight port of glob.c, compile_glob() translates
+# a pattern to a regular expression once and caches it, it's what
+# switch, Glob and compiled matchers use.
+
+import re
+from functools import lru_cache
 
 BITLISTSIZE = 16
+WILDCARDS = "*?[\\"
+PATTERNS_CACHE_SIZE = 4096
+
+# never matches, used for incomplete patterns
+NOTHING = "(?!)"
+
+
+def is_literal(pat: str) -> bool:
+    """True if the pattern matches only the string itself"""
+
+    return not any(c in pat for c in WILDCARDS)
+
+
+def class_to_regex(chars: str) -> str:
+    """[chars] part of a pattern to the regular expression, same as globchars()"""
+
+    neg = chars.startswith("^")
+    if neg:
+        chars = chars[1:]
+
+    items = []
+    i = 0
+    while i < len(chars):
+        if i + 2 < len(chars) and chars[i + 1] == "-":
+            first, last = chars[i], chars[i + 2]
+            if first <= last:
+                items.append(f"{re.escape(first)}-{re.escape(last)}")
+            i += 3
+        else:
+            items.append(re.escape(chars[i]))
+            i += 1
+
+    if neg:
+        # Don't include \0 in either $[chars] or $[^chars]
+        return "[^\\x00" + "".join(items) + "]"
+
+    if not items:
+        return NOTHING
+
+    return "[" + "".join(items) + "]"
+
+
+def glob_to_regex(pat: str) -> str:
+    """Translates the pattern to an equivalent regular expression"""
+
+    res = []
+    i = 0
+    while i < len(pat):
+        c = pat[i]
+        if c == "*":
+            res.append(".*")
+        elif c == "?":
+            res.append(".")
+        elif c == "[":
+            # the first character of the class can be "]"
+            end = pat.find("]", i + 2)
+            if end == -1:
+                res.append(NOTHING)
+                break
+
+            res.append(class_to_regex(pat[i + 1 : end]))
+            i = end
+        elif c == "\\":
+            i += 1
+            if i == len(pat):
+                res.append(NOTHING)
+                break
+
+            res.append(re.escape(pat[i]))
+        else:
+            res.append(re.escape(c))
+
+        i += 1
+
+    return "".join(res)
+
+
+@lru_cache(maxsize=PATTERNS_CACHE_SIZE)
+def compile_glob(pat: str, ignore_case: bool = False) -> re.Pattern:
+    flags = re.DOTALL | (re.IGNORECASE if ignore_case else 0)
+    return re.compile(glob_to_regex(pat), flags)
+
+
+@lru_cache(maxsize=PATTERNS_CACHE_SIZE)
+def compile_globs(patterns: tuple[str, ...]) -> re.Pattern:
+    """One expression matching any of the patterns"""
+
+    return re.compile("|".join(f"(?:{glob_to_regex(p)})" for p in patterns), re.DOTALL)
+
+
+@lru_cache(maxsize=PATTERNS_CACHE_SIZE)
+def compile_regex(pat: str) -> re.Pattern:
+    """Regular expressions of Match rule"""
+
+    return re.compile(pat)
+
+
+def glob_match(pat: str, string: str) -> bool:
+    return compile_glob(pat).fullmatch(string) is not None
+
+
+def filter_matching(patterns: list[str] | tuple[str, ...], strings: list) -> list:
+    """Returns strings matching any of the patterns, in the same order"""
+
+    fullmatch = compile_globs(tuple(patterns)).fullmatch
+    return [s for s in strings if fullmatch(s)]
+
+
+def compile_pattern(pat: str):
+    """Returns function(string) -> bool, same as match(pat, string) == 0"""
+
+    if is_literal(pat):
+        return pat.__eq__
+
+    rest = pat[1:]
+    if pat[0] == "*" and is_literal(rest):
+        return lambda string: string.endswith(rest)
+
+    start = pat[:-1]
+    if pat[-1] == "*" and is_literal(start):
+        return lambda string: string.startswith(start)
+
+    fullmatch = compile_glob(pat).fullmatch
+    return lambda string: fullmatch(string) is not None
 
 
 def check_bit(tab: bytearray, bit: int):
@@ -36,8 +167,8 @@ def match(pat: str, string: str, ignore_case: bool = False):
                 if j == len(string):
                     return 1
 
-                # scan for matching
-                second_idx = pat[i:].find("]")
+                # scan for matching, the first character can be "]"
+                second_idx = pat.find("]", i + 2)
                 if second_idx == -1:
                     return 1
 
@@ -58,7 +189,7 @@ def match(pat: str, string: str, ignore_case: bool = False):
                 # call.  If the match fails we'll back up chars, retrying.
                 while jj != j:
                     if i != len(pat):
-                        r = match(pat[i:], string[jj:])
+                        r = match(pat[i:], string[jj:], ignore_case)
                     else:
                         r = 0 if jj == len(string) else -1
 
@@ -72,12 +203,19 @@ def match(pat: str, string: str, ignore_case: bool = False):
                 i += 1
 
                 # Force literal match of next char.
-                if i == len(pat) or string[j] != pat[i]:
+                if i == len(pat) or j == len(string) or string[j] != pat[i]:
                     return 1
 
                 j += 1
+                i += 1
             case _:
-                if ignore_case and string[j].lower() != pat[i].lower() or j == len(string) or string[j] != pat[i]:
+                if j == len(string):
+                    return 1
+
+                if ignore_case:
+                    if string[j].lower() != pat[i].lower():
+                        return 1
+                elif string[j] != pat[i]:
                     return 1
 
                 j += 1
@@ -90,14 +228,14 @@ def globchars(pat: str):
     bitlist = bytearray(BITLISTSIZE)
 
     i = 0
-    if pat[i] == "^":
+    if pat[:1] == "^":
         neg = True
         i += 1
 
     while i < len(pat):
-        if i + 2 < len(pat) and pat[1] == "-":
-            for c in range(pat[0:3]):
-                bitlist[ord(c) / 8] |= 1 << (ord(c) % 8)
+        if i + 2 < len(pat) and pat[i + 1] == "-":
+            for c in range(ord(pat[i]), ord(pat[i + 2]) + 1):
+                bitlist[c // 8] |= 1 << (c % 8)
             i += 3
         else:
             c = ord(pat[i])
@@ -0,0 +1,252 @@
+#
+# rule_memo.py - memoized calls of pure rules
+#
+# A rule is pure if it only assigns its own locals, calls pure rules and
+# builtins computing values from their arguments, and has no actions.
+# Such rules (and the rules listed by the Memoize builtin) are called once
+# for the same parameters: the result is kept with versions of variables
+# read by the call and reused while these variables are not changed.
+#
+# Target-specific variables have no versions, calls under `on target` are
+# never memoized. Calls with side effects (file access, output) are not
+# memoized either.
+#
+
+from collections.abc import Callable
+
+from jamp.classes import Rule, State
+from jamp.expand import VarTemplate, template
+from jamp.jam_syntax import Arg, Node
+
+RULE_MEMO_SIZE = 65536
+
+# builtins without effects, the result depends only on the arguments
+PURE_BUILTINS = frozenset(
+    (
+        "match",
+        "sort",
+        "unique",
+        "length",
+        "split",
+        "split_by_characters",
+        "subst",
+    )
+)
+
+
+def static_name(arg) -> str | None:
+    if isinstance(arg, Arg) and isinstance(arg.value, str) and "$" not in arg.value:
+        return arg.value
+
+
+def pure_value(state: State, node) -> bool:
+    """True if evaluating a list, an argument or an expression has no effects"""
+
+    if isinstance(node, Arg):
+        match node.value:
+            case str():
+                return True
+            case (Node.FUNC, name, lol):
+                return pure_call(state, name, lol)
+
+        # [ on target ... ] reads target variables
+        return False
+
+    if isinstance(node, (list, tuple)):
+        return all(pure_value(state, item) for item in node)
+
+    return True
+
+
+def pure_call(state: State, name: Arg, lol) -> bool:
+    from jamp.executors import builtins
+
+    rule_name = static_name(name)
+    if rule_name is None or not pure_value(state, lol):
+        return False
+
+    if rule_name.lower() in PURE_BUILTINS:
+        return True
+
+    if getattr(builtins, rule_name.lower(), None):
+        return False
+
+    return pure_rule(state, rule_name)
+
+
+def pure_block(state: State, items, local_names: set) -> bool:
+    if isinstance(items, tuple):
+        # a single statement
+        items = [items]
+
+    return all(pure_statement(state, item, local_names) for item in items or ())
+
+
+def pure_statement(state: State, node, local_names: set) -> bool:
+    match node:
+        case (Node.LOCAL, names, value):
+            for name in names:
+                name = static_name(name)
+                if name is None:
+                    return False
+
+                local_names.add(name)
+
+            return pure_value(state, value)
+
+        case (Node.ASSIGN, name, _, value):
+            return static_name(name) in local_names and pure_value(state, value)
+
+        case (Node.CALL, name, lol):
+            return pure_call(state, name, lol)
+
+        case (Node.RETURN | Node.BREAK | Node.CONTINUE, value):
+            return pure_value(state, value)
+
+        case (Node.IF, expr, *blocks):
+            return pure_value(state, expr) and all(
+                pure_block(state, block, set(local_names)) for block in blocks
+            )
+
+        case (Node.WHILE, expr, block):
+            return pure_value(state, expr) and pure_block(
+                state, block, set(local_names)
+            )
+
+        case (Node.FOR, varname, items, block):
+            return (
+                static_name(Arg(varname)) in local_names
+                and pure_value(state, items)
+                and pure_block(state, block, set(local_names))
+            )
+
+        case (Node.SWITCH, arg, cases):
+            return pure_value(state, arg) and all(
+                pure_block(state, block, set(local_names)) for _, _, block in cases
+            )
+
+        case [*items]:
+            # a nested block, it does not get its own scope
+            return pure_block(state, items, local_names)
+
+    # rule and actions definitions, includes, `on` and target variables
+    return False
+
+
+def reads_only(value, names: set) -> bool:
+    """True if expanding the list reads no variables but the names"""
+
+    for arg in value or ():
+        if not isinstance(arg, Arg) or not isinstance(arg.value, str):
+            return False
+
+        tmpl = template(arg.value)
+        if isinstance(tmpl, VarTemplate):
+            if tmpl.deps is None or not names.issuperset(tmpl.deps):
+                return False
+
+    return True
+
+
+def own_locals(block) -> frozenset:
+    """
+    Locals declared at the start of the rule body, a call reads only its own
+    values of them
+    """
+
+    names = set()
+    for node in block if isinstance(block, list) else ():
+        match node:
+            case (Node.LOCAL, declared, value) if reads_only(value, names):
+                declared = [static_name(name) for name in declared]
+                if None in declared:
+                    break
+
+                names.update(declared)
+            case _:
+                break
+
+    return frozenset(names)
+
+
+def pure_rule(state: State, name: str) -> bool:
+    """True if calls of the rule have no effects, results are cached in the state"""
+
+    pure = state.pure_rules.get(name)
+    if pure is not None:
+        return pure
+
+    # recursive calls are not analyzed, the rule is impure while it's checked
+    state.pure_rules[name] = False
+
+    rule = state.rules.get(name)
+    pure = (
+        rule is not None
+        and name not in state.actions
+        and pure_block(state, rule.block, set())
+    )
+    state.pure_rules[name] = pure
+    return pure
+
+
+def memoized(rule: Rule, fn: Callable) -> Callable:
+    """Returns a function calling fn(state, params) once for the same arguments"""
+
+    from jamp.executors import Result
+
+    own = own_locals(rule.block)
+
+    def call(state: State, params: list):
+        state_vars = state.vars
+        if state_vars.current_context:
+            return fn(state, params)
+
+        versions = state_vars.versions
+        memo = state.rule_memo
+        key = (rule, tuple(tuple(param) for param in params))
+
+        found = memo.get(key)
+        if found is not None:
+            reads, res = found
+            for name, version in reads:
+                if versions.get(name, 0) != version:
+                    break
+            else:
+                state.rule_memo_hits += 1
+                if state_vars.reads is not None:
+                    state_vars.reads.update(name for name, _ in reads)
+
+                return None if res is None else Result(list(res))
+
+        state.rule_memo_misses += 1
+        outer_reads = state_vars.reads
+        side_effects = state.side_effects
+
+        state_vars.reads = reads = set()
+        try:
+            ret = fn(state, params)
+        finally:
+            state_vars.reads = outer_reads
+            reads -= own
+            if outer_reads is not None:
+                outer_reads.update(reads)
+
+        if state.side_effects != side_effects:
+            return ret
+
+        # the call has no lasting changes, versions after the call are the
+        # versions of the same values before the next one
+        if len(memo) >= RULE_MEMO_SIZE:
+            memo.clear()
+
+        res = tuple(ret.val) if isinstance(ret, Result) else None
+        memo[key] = (tuple((name, versions.get(name, 0)) for name in reads), res)
+        return ret
+
+    return call
+
+
+def rule_memo_stats(state: State) -> str:
+    total = state.rule_memo_hits + state.rule_memo_misses
+    rate = state.rule_memo_hits * 100 / total if total else 0
+    return f"{total} rule call(s) memoized, {rate:.1f}% hits"
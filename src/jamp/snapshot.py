@@ -0,0 +1,138 @@
+#
+# snapshot.py - interpreter state after the Jambase evaluation
+#
+# Jambase defines a few hundred rules and variables and it's the same for
+# every project, so the state it produces is saved to the cache directory
+# and restored on the next run instead of evaluating Jambase again.
+#
+# The snapshot is keyed by jamp sources, Jambase contents and the platform.
+# Variables read while evaluating Jambase are saved with their values
+# before the evaluation (environment, -e options and jamp presets),
+# the snapshot is used only if they are the same in the current run.
+# The trailing `include $(JAMFILE) ;` is never a part of the snapshot.
+#
+
+import hashlib
+import os
+import platform
+import sys
+from functools import cache
+
+from jamp import __version__
+from jamp.cache import cache_file, load_pickle, save_pickle
+from jamp.classes import State
+from jamp.jam_syntax import Node
+from jamp.paths import check_vms
+
+SNAPSHOT_VERSION = 1
+
+# State attributes filled by Jambase, they're pickled together to keep
+# references between rules, actions and targets.
+STATE_ATTRS = (
+    "rules",
+    "actions",
+    "targets",
+    "build_steps",
+    "always_build",
+    "header_macros",
+    "target_locations",
+)
+
+
+@cache
+def sources_fingerprint() -> str:
+    h = hashlib.sha256(__version__.encode())
+    basedir = os.path.dirname(__file__)
+    for fn in sorted(os.listdir(basedir)):
+        if fn.endswith(".py"):
+            with open(os.path.join(basedir, fn), "rb") as f:
+                h.update(fn.encode())
+                h.update(f.read())
+
+    return h.hexdigest()
+
+
+def snapshot_file(jambase_contents: str) -> str | None:
+    if check_vms():
+        # symbols are read lazily, the environment is not known beforehand
+        return None
+
+    h = hashlib.sha256(str(SNAPSHOT_VERSION).encode())
+    h.update(sources_fingerprint().encode())
+    # not the whole uname, the host name must not change the key
+    h.update(repr((platform.system(), platform.machine())).encode())
+    h.update(sys.version.encode())
+    h.update(jambase_contents.encode())
+
+    return cache_file(f"jambase-{h.hexdigest()}.pickle")
+
+
+def split_jambase(ast: list) -> tuple[list, list]:
+    """Splits Jambase to the project independent part and trailing includes"""
+
+    idx = len(ast)
+    while idx > 0 and ast[idx - 1][0] == Node.INCLUDE:
+        idx -= 1
+
+    return ast[:idx], ast[idx:]
+
+
+def restore(state: State, path: str | None) -> bool:
+    data = load_pickle(path)
+    if not isinstance(data, dict) or data.get("version") != SNAPSHOT_VERSION:
+        return False
+
+    global_scope = state.vars.global_scope
+    for name, value in data["reads"].items():
+        if global_scope.get(name) != value:
+            if state.verbose:
+                print(f"jamp: Jambase snapshot is not used, {name} differs")
+            return False
+
+    global_scope.update(data["globals"])
+    for name in data["globals"]:
+        state.vars.touch(name)
+    for attr, value in zip(STATE_ATTRS, data["state"], strict=True):
+        setattr(state, attr, value)
+
+    state.rules_changed()
+
+    if state.verbose:
+        print("...Jambase state restored from snapshot...")
+
+    return True
+
+
+def run_and_save(state: State, base: list, path: str | None) -> None:
+    """Evaluates Jambase and saves the snapshot if it only changed the state"""
+
+    from jamp.compile import compile_block
+    from jamp.executors import run
+
+    initial = dict(state.vars.global_scope)
+    side_effects = state.side_effects
+
+    state.vars.reads = set() if path else None
+    try:
+        run(state, compile_block(state, base))
+    finally:
+        reads = state.vars.reads
+        state.vars.reads = None
+
+    if path is None or state.side_effects != side_effects:
+        return
+
+    changed = {
+        k: v
+        for k, v in state.vars.global_scope.items()
+        if k not in initial or initial[k] is not v
+    }
+    data = {
+        "version": SNAPSHOT_VERSION,
+        "reads": {name: initial.get(name) for name in reads},
+        "globals": changed,
+        "state": tuple(getattr(state, attr) for attr in STATE_ATTRS),
+    }
+
+    if not save_pickle(path, data) and state.verbose:
+        print(f"jamp: could not save Jambase snapshot to {path}")
@@ -61,7 +61,10 @@
 # own risk!
 # ----------------------------------------------------------------------------
 
+import hashlib
 import inspect
+import os
+import pickle
 import re
 import sys
 import types
@@ -77,6 +80,7 @@ yaccdebug = False  # Debugging mode.  If set, yacc generates a
 # a 'parser.out' file in the current directory
 
 debug_file = "parser.out"  # Default name of the debugging file
+__tabversion__ = "3.10"  # Version of the cached table format
 error_count = 3  # Number of symbols that must be shifted to leave recovery mode
 resultlimit = 40  # Size limit of results when running in debug mode.
 
@@ -738,6 +742,36 @@ class Production:
             self.callable = pdict[self.func]
 
 
+# -----------------------------------------------------------------------------
+# class MiniProduction
+#
+# This class is a stripped down version of Production used when the parsing
+# tables are loaded from a cache.  It keeps only what LRParser.parse() needs.
+# -----------------------------------------------------------------------------
+
+
+class MiniProduction:
+    def __init__(self, str, name, len, func, file, line):
+        self.name = name
+        self.len = len
+        self.func = func
+        self.callable = None
+        self.file = file
+        self.line = line
+        self.str = str
+
+    def __str__(self):
+        return self.str
+
+    def __repr__(self):
+        return f"MiniProduction({self.str})"
+
+    # Bind the production function name to a callable
+    def bind(self, pdict):
+        if self.func:
+            self.callable = pdict[self.func]
+
+
 # -----------------------------------------------------------------------------
 # class LRItem
 #
@@ -1391,6 +1425,37 @@ class LALRError(YaccError):
 # -----------------------------------------------------------------------------
 
 
+class CachedLRTable:
+    """Action/goto tables loaded from a file written by LRTable.pickle_table()"""
+
+    def __init__(self, lr_action, lr_goto, productions):
+        self.lr_action = lr_action
+        self.lr_goto = lr_goto
+        self.lr_productions = [MiniProduction(*p) for p in productions]
+
+    @classmethod
+    def read_pickle(cls, filename, signature=""):
+        """Returns None if the file is missing, broken or built for another grammar"""
+        try:
+            with open(filename, "rb") as f:
+                data = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ValueError):
+            return None
+
+        if not isinstance(data, tuple) or len(data) != 5:
+            return None
+
+        tabversion, tabsig, lr_action, lr_goto, productions = data
+        if tabversion != __tabversion__ or tabsig != signature:
+            return None
+
+        return cls(lr_action, lr_goto, productions)
+
+    def bind_callables(self, pdict):
+        for p in self.lr_productions:
+            p.bind(pdict)
+
+
 class LRTable:
     def __init__(self, grammar, log=None):
         self.grammar = grammar
@@ -1428,6 +1493,22 @@ class LRTable:
         for p in self.lr_productions:
             p.bind(pdict)
 
+    # Write the action/goto tables to a pickle file, tagged with the grammar
+    # signature so a stale file is never reused for a different grammar.
+    def pickle_table(self, filename, signature=""):
+        productions = [
+            (p.str, p.name, p.len, p.func, os.path.basename(p.file), p.line)
+            for p in self.lr_productions
+        ]
+        data = (__tabversion__, signature, self.lr_action, self.lr_goto, productions)
+
+        tmpname = f"{filename}.{os.getpid()}.tmp"
+        with open(tmpname, "wb") as f:
+            pickle.dump(data, f, pickle.HIGHEST_PROTOCOL)
+
+        # atomic, concurrent processes could write the same file
+        os.replace(tmpname, filename)
+
     # Compute the LR(0) closure operation on I, where I is a set of LR(0) items.
 
     def lr0_closure(self, I):
@@ -2420,6 +2501,7 @@ def yacc(
     debugfile=debug_file,
     debuglog=None,
     errorlog=None,
+    picklefile=None,
 ):
 
     # Reference to the parsing method of the last built parser
@@ -2454,6 +2536,16 @@ def yacc(
     if pinfo.error:
         raise YaccError("Unable to build parser")
 
+    # Try to reuse the tables built by a previous run for the same grammar
+    signature = hashlib.sha256(pinfo.signature().encode("utf-8")).hexdigest()
+    if picklefile and not debug:
+        lr = CachedLRTable.read_pickle(picklefile, signature)
+        if lr is not None:
+            lr.bind_callables(pinfo.pdict)
+            parser = LRParser(lr, pinfo.error_func)
+            parse = parser.parse
+            return parser
+
     if debuglog is None:
         if debug:
             try:
@@ -2652,6 +2744,12 @@ def yacc(
                 errorlog.warning("Rule (%s) is never reduced", rejected)
                 warned_never.append(rejected)
 
+    if picklefile:
+        try:
+            lr.pickle_table(picklefile, signature)
+        except OSError as e:
+            errorlog.warning(f"Couldn't create {picklefile!r}. {e}")
+
     # Build the parser
     lr.bind_callables(pinfo.pdict)
     parser = LRParser(lr, pinfo.error_func)
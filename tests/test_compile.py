@@ -1,10 +1,15 @@
 import os
+import pickle
+
+import pytest
 
 from jamp.classes import State
-from jamp.compile import compile
-from jamp.executors import run
-from jamp.jam_builtins import Builtins
-from jamp.jam_syntax import parse
+from jamp.compile import compile, compile_block
+from jamp.executors import Result, exec_one_rule, rule_dispatcher, run
+from jamp.jam_builtins import NATIVE_RULES, Builtins
+from jamp.jam_syntax import Node, parse, same_ast
+from jamp.rule_memo import pure_rule
+from jamp.snapshot import split_jambase
 
 
 def expect_output(expected):
@@ -740,3 +745,448 @@ if $(a:S) = ""
     run(state, state.parse_and_compile(rules))
     output = "ok\n"
     expect_output(output)
+
+
+def test_rules_compiled_on_first_call():
+    rules = """
+rule Used { Echo "used" $(<) ; }
+rule Unused { Echo "unused" ; }
+
+Used a ;
+Used b ;
+    """
+
+    state = State()
+    run(state, state.parse_and_compile(rules))
+    expect_output("used a\nused b\n")
+
+    assert state.rules["Used"].commands is not None
+    assert state.rules["Unused"].commands is None
+
+    # the AST of compiled rules is kept pickled, a copy compiles it again
+    used = state.rules["Used"]
+    assert used.ast is None
+    assert same_ast(used.block, parse(rules)[0][3])
+
+    copy = pickle.loads(pickle.dumps(used))
+    assert copy.commands is None
+    run(state, copy.compiled(state))
+    expect_output("used\n")
+
+
+def test_closures_match_tree():
+    rules = """
+rule R
+{
+    local x = $(1) ;
+    for i in a b c d
+    {
+        if $(i) = b { continue ; }
+        if $(i) = d { break ; Echo "unreachable" ; }
+        x += $(i) ;
+    }
+
+    switch $(2)
+    {
+        case q* : { local y = in-case ; Echo $(y) ; }
+        case * : Echo "default" $(2) ;
+    }
+
+    n = ;
+    while ! $(n[3])
+    {
+        n += 1 ;
+        if $(n[2]) && ! $(n[3]) { continue ; }
+        Echo "while" $(n) ;
+    }
+
+    return $(x) ;
+    Echo "after return" ;
+}
+
+Echo [ R first : quux ] ;
+Echo [ R second : z ] ;
+if a in a b && ! ( x < w ) || $(undefined) { Echo "expr" ; }
+else if $(UNDEFINED) { Echo "no" ; }
+else { Echo "else" ; }
+{ Echo "nested" ; }
+    """
+
+    state = State(trace_on=True)
+    run(state, state.parse_and_compile(rules))
+    expected = Builtins.output
+    Builtins.clear_output()
+    assert "after return" in expected
+
+    state = State()
+    run(state, state.parse_and_compile(rules))
+    expect_output(expected)
+
+
+def test_empty_blocks():
+    rules = """
+{ } Echo a ;
+rule R { { } Echo r ; }
+R ;
+for i in a { { } Echo f ; }
+n = ;
+while ! $(n) { { } n = 1 ; Echo w ; }
+switch x { case x : { } Echo y ; }
+switch x { case x : { } { Echo z ; } Echo never ; }
+    """
+
+    for trace_on in (True, False):
+        state = State(trace_on=trace_on)
+        run(state, state.parse_and_compile(rules))
+        expect_output("a\nr\nf\nw\ny\nz\n")
+
+
+def test_backtrace(capsys):
+    rules = """
+rule Inner { if $(X) { Exit failed $(2) ; } }
+rule Outer { for i in $(y) { Inner $(X) : $(2) ; Inner a ; } }
+X = 1 ;
+y = q ;
+Outer a : b ;
+    """
+
+    state = State(trace_on=True)
+    Builtins.traceback = []
+    try:
+        with pytest.raises(SystemExit):
+            run(state, state.parse_and_compile(rules))
+
+        Builtins.backtrace()
+    finally:
+        Builtins.traceback = None
+
+    assert capsys.readouterr().out == (
+        "\nTraceback (jamp):\n"
+        "\t1: rules (Exit, (LOL, [failed, $(2)]))\n"
+        "\t2: if ([EXPR, $(X)],)\n"
+        "\t\tevaluated to: True\n"
+        "\t3: one_rule ('Inner', [['1'], ['b']])\n"
+        "\t\tname: Inner\n"
+        "\t4: rules (Inner, (LOL, [$(X)], [$(2)]))\n"
+        "\t5: for ('i', [$(y)], [F:inner, F:inner])\n"
+        "\t6: one_rule ('Outer', [['a'], ['b']])\n"
+        "\t\tname: Outer\n"
+        "\t7: rules (Outer, (LOL, [a], [b]))\n"
+        "\n"
+    )
+    expect_output("failed b\n")
+
+
+def test_dynamic_scoping():
+    rules = """
+x = global ;
+rule Inner
+{
+    Echo "inner sees" $(x) ;
+    x = set-by-inner ;
+    local y = inner-local ;
+    z ?= z-default ;
+}
+
+rule Outer
+{
+    local x = outer-local ;
+    Inner ;
+    Echo "outer after inner" $(x) $(y) ;
+    if 1
+    {
+        local x = block-local ;
+        x += more ;
+        Echo "block" $(x) ;
+    }
+    Echo "outer after block" $(x) ;
+}
+
+Outer ;
+Echo "global" $(x) $(y) $(z) ;
+Inner ;
+Echo "global" $(x) ;
+    """
+
+    state = State()
+    run(state, state.parse_and_compile(rules))
+    output = (
+        "inner sees outer-local\n"
+        "outer after inner set-by-inner\n"
+        "block block-local more\n"
+        "outer after block set-by-inner\n"
+        "global global z-default\n"
+        "inner sees global\n"
+        "global set-by-inner\n"
+    )
+    expect_output(output)
+    assert not state.vars.saved
+    assert not state.vars.marks
+
+
+def test_rule_dispatch_redefined():
+    rules = """
+rule R { Echo "first" $(<) ; }
+for i in a b { R $(i) ; }
+
+rule R { Echo "second" $(<) ; }
+R c ;
+
+actions R { touch $(<) }
+R d ;
+    """
+
+    state = State()
+    run(state, state.parse_and_compile(rules))
+    expect_output("first a\nfirst b\nsecond c\nsecond d\n")
+
+    assert "R" in state.rule_dispatch
+    assert [t.name for t in state.build_steps[0][0]] == ["d"]
+
+
+def test_switch_first_match():
+    rules = """
+for f in a.c b.cpp c.h Makefile .c
+{
+    switch $(f)
+    {
+        case *.cpp : Echo $(f) "cpp" ;
+        case b.cpp : Echo $(f) "never" ;
+        case Makefile : Echo $(f) "make" ;
+        case *.c : Echo $(f) "c" ;
+        case a.c : Echo $(f) "never" ;
+        case *.? : Echo $(f) "one char" ;
+        case * : Echo $(f) "any" ;
+    }
+}
+
+switch $(EMPTY)
+{
+    case ?* : Echo "never" ;
+    case * : Echo "empty" ;
+}
+
+switch a.h
+{
+    case *.c :
+    case *.h :
+    case * : Echo "never" ;
+}
+    """
+
+    output = "a.c c\nb.cpp cpp\nc.h one char\nMakefile make\n.c c\nempty\n"
+
+    state = State()
+    run(state, state.parse_and_compile(rules))
+    expect_output(output)
+
+    state = State()
+    run(state, compile(state, parse(rules)))
+    expect_output(output)
+
+
+def test_append_in_place():
+    rules = """
+A = 1 ;
+B = $(A) ;
+for i in 2 3 { A += $(i) ; }
+C = $(A) ;
+A += 4 ;
+Echo a $(A) b $(B) c $(C) ;
+
+F on t = -a ;
+on t { G on t = $(F) ; }
+for i in -b -c { F on t += $(i) ; }
+    """
+
+    state = State()
+    run(state, state.parse_and_compile(rules))
+    expect_output("a 1 2 3 4 b 1 c 1 2 3\n")
+
+    # a list given out by get() is not changed by later appends
+    kept = state.vars.get("A")
+    assert state.vars.append("A", ["5"])
+    assert kept == ["1", "2", "3", "4"]
+    assert state.vars.get("A") == ["1", "2", "3", "4", "5"]
+    assert not state.vars.append("UNSET", ["1"])
+
+    target = state.get_target("t")
+    assert target.vars["F"] == ["-a", "-b", "-c"]
+    assert target.vars["G"] == ["-a"]
+
+
+def test_list_builtins():
+    rules = r"""
+L = c a b a c ;
+Echo [ Sort $(L) ] - [ Unique $(L) ] - [ Length $(L) ] [ Length ] ;
+Echo [ Unique $(L) d : b d e ] ;
+Echo [ Split a/b//c.d e : /. ] ;
+Echo [ Subst foo.c bar.c : "\\.c$" : .o ] [ Subst lib_x : "^lib_(.*)" : "\\1" ] ;
+    """
+
+    state = State()
+    run(state, state.parse_and_compile(rules))
+    expect_output("a a b c c - c a b - 5 0\nc a\na b c d e\nfoo.o bar.o x\n")
+
+
+def test_memoized_rules():
+    rules = """
+rule Flags
+{
+    local f r ;
+    for f in $(1) { r += -D$(f) ; }
+    return $(r) $(OPT) [ Sort $(2) ] ;
+}
+
+rule Report { Echo $(1) ; return $(1) ; }
+
+rule Count { N += 1 ; return $(N) ; }
+
+OPT = -O1 ;
+Echo [ Flags a b : y x ] ;
+Echo [ Flags a b : y x ] ;
+OPT = -O2 ;
+Echo [ Flags a b : y x ] ;
+Echo [ Flags z ] [ Flags a b : y x ] ;
+
+rule Shadow { local OPT = -O3 ; return [ Flags c ] ; }
+Echo [ Shadow ] [ Flags c ] ;
+
+N = 0 ;
+Memoize Count ;
+Echo [ Report r ] [ Report r ] [ Count ] [ Count ] $(N) ;
+    """
+
+    state = State()
+    run(state, state.parse_and_compile(rules))
+    expect_output(
+        "-Da -Db -O1 x y\n-Da -Db -O1 x y\n-Da -Db -O2 x y\n"
+        "-Dz -O2 -Da -Db -O2 x y\n"
+        "-Dc -O3 -Dc -O2\nr\nr\nr r 0 1 0 1 0 1\n"
+    )
+
+    assert state.pure_rules["Flags"] and state.pure_rules["Shadow"]
+    assert not state.pure_rules["Report"]
+    # locals of other calls are not compared
+    assert state.rule_memo_hits == 3
+
+    # redefined callees are not pure anymore
+    run(state, state.parse_and_compile("rule Flags { Echo $(1) ; }"))
+    assert not pure_rule(state, "Shadow")
+
+
+def test_shared_target_vars():
+    rules = """
+rule Value { Echo "evaluated" ; return -I. ; }
+
+HDRS on a b c = [ Value ] ;
+DEFINES on b += -DB ;
+on a { HDRS on a += -Iinc ; Echo $(HDRS) ; }
+    """
+
+    state = State()
+    run(state, state.parse_and_compile(rules))
+    expect_output("evaluated\n-I. -Iinc\n")
+
+    a, b, c = (state.get_target(name) for name in "abc")
+    assert a.vars == {"HDRS": ["-I.", "-Iinc"]}
+    assert b.vars == {"HDRS": ["-I."], "DEFINES": ["-DB"]}
+    assert c.vars == {"HDRS": ["-I."]}
+    assert b.vars["HDRS"] is c.vars["HDRS"]
+
+    # blocks without assignments to the target don't copy the table
+    shared = c.vars
+    run(state, state.parse_and_compile("on c { Echo $(HDRS) ; }"))
+    expect_output("-I.\n")
+    assert c.vars is shared
+
+    run(state, state.parse_and_compile("LOCATE on c d = out ;"))
+    d = state.get_target("d")
+    assert c.vars == {"HDRS": ["-I."], "LOCATE": ["out"]}
+    assert d.vars == {"LOCATE": ["out"]}
+
+
+def test_native_jambase_rules():
+    jambase = os.path.join(os.path.dirname(__file__), "..", "src", "jamp", "Jambase")
+    with open(jambase) as f:
+        base, _ = split_jambase(parse(f.read()))
+
+    # rules are interpreted with tracing, calls inside them too
+    jam = State(trace_on=True)
+    run(jam, compile(jam, base))
+    native = State()
+    run(native, compile_block(native, base))
+
+    for name in NATIVE_RULES:
+        assert native.rules[name].native is not None, name
+
+    def values(res):
+        return res.val if isinstance(res, Result) else []
+
+    lists = [
+        [],
+        [""],
+        ["a"],
+        ["a", "b"],
+        ["a", "", "b"],
+        ["<g>x.c", "y.h", "d/z.cpp"],
+        ["..", "sub", "dir"],
+        ["/abs", "p"],
+        [".x", "f."],
+    ]
+
+    for grist in ([], ["grist"], ["g1", "g2"]):
+        for state in (jam, native):
+            state.vars.set("SOURCE_GRIST", grist)
+
+        for name in NATIVE_RULES:
+            for left in lists:
+                for right in lists[:5]:
+                    for state in (jam, native):
+                        state.vars.set("V1", left)
+                        state.vars.set("V2", right)
+
+                    if name == "FStripCommon":
+                        params = [["V1"], ["V2"]]
+                    else:
+                        params = [left, right]
+
+                    expected = values(exec_one_rule(jam, name, params))
+                    res = values(rule_dispatcher(native, name)(native, params))
+                    assert res == expected, (name, params)
+
+                    for var in ("V1", "V2"):
+                        assert native.vars.get(var) == jam.vars.get(var)
+
+    # redefined rules are interpreted
+    run(native, native.parse_and_compile("rule FDefines { return /D$(<) ; }"))
+    assert native.rules["FDefines"].native is None
+    assert values(rule_dispatcher(native, "FDefines")(native, [["X"]])) == ["/DX"]
+
+    # native versions are not builtins, rules with the same names are called
+    run(native, native.parse_and_compile("rule Native_FGrist { return user ; }"))
+    assert values(rule_dispatcher(native, "Native_FGrist")(native, [["X"]])) == ["user"]
+
+
+def test_pkg_append():
+    jambase = os.path.join(os.path.dirname(__file__), "..", "src", "jamp", "Jambase")
+    with open(jambase) as f:
+        base, _ = split_jambase(parse(f.read()))
+
+    state = State()
+    run(state, compile_block(state, base))
+
+    # the membership test is done by Unique, not a loop over the items
+    block = state.rules["_PkgAppend"].block
+    assert len(block) == 1 and block[0][0] == Node.ASSIGN
+
+    rules = """
+V = b a b ;
+_PkgAppend V : c a d c b e ;
+_PkgAppend V : ;
+_PkgAppend U : x y x ;
+Echo $(V) - $(U) ;
+    """
+
+    run(state, state.parse_and_compile(rules))
+    expect_output("b a b c d e - x y\n")
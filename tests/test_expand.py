@@ -1,11 +1,20 @@
+import itertools
 from os import sep as S
-from pathlib import Path
+from pathlib import Path, PurePosixPath
 
 from jamp.classes import State
 from jamp.executors import run
 from jamp.expand import MAGIC_COLON as MC
-from jamp.expand import var_edit_parse, var_expand, var_string
-from jamp.paths import Pathname
+from jamp.expand import (
+    ConstTemplate,
+    ParamTemplate,
+    VarTemplate,
+    template,
+    var_edit_parse,
+    var_expand,
+    var_string,
+)
+from jamp.paths import Pathname, join_posix, split_posix
 
 
 def test_nested():
@@ -44,6 +53,58 @@ def test_params():
     ]
 
 
+def test_templates():
+    assert template("plain").expand([], {}) == ["plain"]
+    assert isinstance(template("plain"), ConstTemplate)
+    assert isinstance(template("$(<)"), ParamTemplate)
+
+    t = template("$(a:S=.o)-$(b[2])")
+    assert isinstance(t, VarTemplate)
+    assert t.ref is not None
+    assert t.expand([], {"a": ["x.c", "y.c"], "b": ["1", "2"]}) == ["x.o-2", "y.o-2"]
+
+    # names known only on expansion
+    t = template("$($(a)[1])")
+    assert t.ref is None
+    assert t.expand([], {"a": ["b"], "b": ["1", "2"]}) == ["1"]
+
+
+def test_memoized_expansion():
+    state = State()
+    vs = state.vars
+    vs.set("a", ["x.c", "y.c"])
+    vs.set("SUF", [".o"])
+
+    t = template("$(a:S=$(SUF))")
+    assert t.deps == ("SUF", "a")
+    assert t.expand([], vs) == ["x.o", "y.o"]
+    assert t.expand([], vs) == ["x.o", "y.o"]
+    assert (vs.memo_hits, vs.memo_misses) == (1, 1)
+
+    vs.set("SUF", [".obj"])
+    assert t.expand([], vs) == ["x.obj", "y.obj"]
+
+    vs.push()
+    vs.set_local("a", ["z.c"])
+    assert t.expand([], vs) == ["z.obj"]
+    vs.pop()
+    assert t.expand([], vs) == ["x.obj", "y.obj"]
+
+    t = template("$(<:S=.o)")
+    assert t.params == (0,)
+    assert t.expand([["a.c"]], vs) == ["a.o"]
+    assert t.expand([["b.c"]], vs) == ["b.o"]
+
+    # target variables are not memoized
+    t = template("$(a:B)")
+    vs.current_context.append({"a": ["t.c"]})
+    assert t.expand([], vs) == ["t"]
+    vs.current_context.pop()
+    assert t.expand([], vs) == ["x", "y"]
+
+    assert template("$($(a):B)").deps is None
+
+
 def test_empty_val():
     assert var_expand("-$(a)", [], {}) == []
     assert var_expand("-$(a)$(b)", [], {}) == []
@@ -188,6 +249,22 @@ def test_paths():
     assert p.build() == f"<g1>{S}add{S}one{S}two{S}three{S}file.c<mem>"
 
 
+def test_posix_paths_match_pathlib():
+    parts = ["", "/", "//", "///", ".", "..", "a", "b.c", ".c", "c.", "a.b.c", "d/"]
+    paths = [
+        "".join(p) for n in range(1, 4) for p in itertools.product(parts, repeat=n)
+    ]
+
+    for path in paths:
+        pure = PurePosixPath(path)
+        assert split_posix(path) == (str(pure.parent), pure.stem, pure.suffix), path
+
+    for args in itertools.product(
+        ["", "/", "/r", "r/", ".", "a/./b", "//x"], paths[:60]
+    ):
+        assert join_posix(*args) == str(PurePosixPath(*args)), args
+
+
 def test_var_edits():
     assert var_expand("$(a:U)", [], {"a": ["ab"]}) == ["AB"]
     assert var_expand("$(a:E=cd)", [], {"a": []}) == ["cd"]
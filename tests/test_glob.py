@@ -1,4 +1,6 @@
-from jamp.pattern import match
+import itertools
+
+from jamp.pattern import compile_pattern, filter_matching, glob_match, match
 
 
 def test_patterns():
@@ -23,3 +25,42 @@ def test_patterns():
     assert match("*c*[efg]?", "1ca123cfi") == 0
     assert match("*c*[efg]j", "1ca123cfi") == 1
     assert match("*c*[^efg]j", "1ca123ckj") == 0
+    assert match("x[a-c]y", "xby") == 0
+    assert match("x[a-c]y", "xdy") == 1
+    assert match("x[^a-c0]y", "x0y") == 1
+    assert match("[]a]", "]") == 0
+    assert match("a\\*", "a*") == 0
+    assert match("a\\*", "ab") == 1
+
+
+def test_compiled_patterns():
+    patterns = ["*", "*.c", "*.c*", "a*", "abc", "", "a?c", "[ab]*", "*c*c"]
+    strings = ["", "a", "abc", "x.c", ".c", "x.cpp", "c", "*", "acbc", "bcd"]
+
+    for pat in patterns:
+        matcher = compile_pattern(pat)
+        for s in strings:
+            assert matcher(s) == (match(pat, s) == 0), (pat, s)
+
+
+def test_compiled_globs():
+    atoms = ["a", "b", "*", "?", "[ab]", "[^a]", "[a-b]", "\\?", "["]
+    strings = ["", "?", "[", "]"]
+    strings += [
+        "".join(p) for n in range(1, 4) for p in itertools.product("ab", repeat=n)
+    ]
+
+    for n in range(1, 4):
+        for atoms_seq in itertools.product(atoms, repeat=n):
+            pat = "".join(atoms_seq)
+            for s in strings:
+                assert glob_match(pat, s) == (match(pat, s) == 0), (pat, s)
+
+
+def test_filter_matching():
+    names = ["main.c", "util.h", "util.c", "Jamfile", "README"]
+
+    assert filter_matching(["*.c"], names) == ["main.c", "util.c"]
+    assert filter_matching(["*.h", "J*"], names) == ["util.h", "Jamfile"]
+    assert filter_matching(["[A-Z]*"], names) == ["Jamfile", "README"]
+    assert filter_matching(["*.o"], names) == []
@@ -156,3 +156,53 @@ b.txt a.txt
                 failed = True
 
             assert not failed, out
+
+
+def test_jambase_snapshot(tmp_path, monkeypatch, capsys):
+    from jamp.build import main_app, parse_args
+
+    def read_build():
+        # dependencies are kept in sets, their order is not stable
+        with open("build.ninja") as f:
+            return [sorted(line.split()) for line in f]
+
+    monkeypatch.setenv("JAMP_CACHE_DIR", str(tmp_path))
+    monkeypatch.delenv("CC", raising=False)
+
+    args = parse_args(skip_args=True)
+    args.verbose = True
+
+    with rel("tests/test_math_example"):
+        main_app(args)
+        assert "restored" not in capsys.readouterr().out
+        assert len(list(tmp_path.glob("jambase-*.pickle"))) == 1
+
+        expected = read_build()
+
+        main_app(args)
+        assert "Jambase state restored" in capsys.readouterr().out
+        assert read_build() == expected
+
+        # variables read by Jambase invalidate the snapshot
+        monkeypatch.setenv("CC", "jamp-test-cc")
+        main_app(args)
+        assert "CC differs" in capsys.readouterr().out
+        with open("build.ninja") as f:
+            assert "jamp-test-cc" in f.read()
+
+        sp.run(["ninja", "-t", "clean"], check=False)
+
+
+def test_jambase_snapshot_key(tmp_path, monkeypatch):
+    import platform
+
+    from jamp.snapshot import snapshot_file
+
+    monkeypatch.setenv("JAMP_CACHE_DIR", str(tmp_path))
+    key = snapshot_file("rule A { }")
+    assert snapshot_file("rule B { }") != key
+
+    # the same snapshot is used on another host
+    uname = platform.uname()
+    monkeypatch.setattr(platform, "uname", lambda: uname._replace(node="other"))
+    assert snapshot_file("rule A { }") == key
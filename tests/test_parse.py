@@ -5,13 +5,51 @@ from jamp.jam_syntax import parse
 def test_parser_is_reused(monkeypatch):
     monkeypatch.setattr(jam_syntax, "_parser", None)
 
-    jam_syntax.parse("a = 1 ;")
+    jam_syntax.parse_ply("a = 1 ;")
     parser = jam_syntax._parser
-    jam_syntax.parse("b = 2 ;")
+    jam_syntax.parse_ply("b = 2 ;")
 
     assert jam_syntax._parser is parser
 
 
+def test_parser_tables_are_cached(monkeypatch, tmp_path):
+    from jamp import yacc
+
+    monkeypatch.setenv("JAMP_CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(jam_syntax, "_parser", None)
+
+    text = "rule A { if $(a) = 1 { Echo $(<) ; } } A x : y ;"
+    expected = str(jam_syntax.parse_ply(text))
+    assert (tmp_path / jam_syntax.PARSETAB_NAME).exists()
+
+    def no_tables(*args, **kwargs):
+        raise AssertionError("tables should be loaded from the cache")
+
+    monkeypatch.setattr(yacc, "LRTable", no_tables)
+    monkeypatch.setattr(jam_syntax, "_parser", None)
+    assert str(jam_syntax.parse_ply(text)) == expected
+    assert isinstance(jam_syntax._parser.productions[1], yacc.MiniProduction)
+
+
+def test_ast_is_cached_by_contents(monkeypatch, tmp_path):
+    monkeypatch.setenv("JAMP_CACHE_DIR", str(tmp_path))
+
+    text = 'actions A { echo "$(<)" ; }\nswitch $(x) { case *.c : B ; }'
+    expected = str(jam_syntax.parse_cached(text, filename="Jamfile"))
+    assert len(list(tmp_path.glob("ast-*.pickle"))) == 1
+
+    def no_parse(*args, **kwargs):
+        raise AssertionError("AST should be loaded from the cache")
+
+    monkeypatch.setattr(jam_syntax, "parse", no_parse)
+    assert str(jam_syntax.parse_cached(text, filename="other/Jamfile")) == expected
+
+    monkeypatch.undo()
+    monkeypatch.setenv("JAMP_CACHE_DIR", str(tmp_path))
+    jam_syntax.parse_cached(text + " C ;")
+    assert len(list(tmp_path.glob("ast-*.pickle"))) == 2
+
+
 def test_simple_assign_sequence():
     rule_t = """
     rule One
@@ -295,3 +333,77 @@ def test_parse_lol_with_empty():
     """
     ast = parse(text)
     assert str(ast) == "[(CALL, One, (LOL, [1], None, [2]))]"
+
+
+def lexer_tokens(lexer_cls, text):
+    from jamp.jam_lexer import LexerError
+
+    lexer = lexer_cls()
+    lexer.input(text)
+    res = []
+    try:
+        while tok := lexer.token():
+            res.append((tok.type, tok.value, tok.lineno, tok.lexpos))
+    except LexerError as e:
+        res.append(("error", str(e)))
+
+    return res, lexer.current_lineno()
+
+
+def test_lexer_matches_char_lexer():
+    from pathlib import Path
+
+    from jamp.jam_lexer import CharLexer, Lexer
+
+    root = Path(__file__).parent.parent
+    texts = [p.read_text() for p in root.glob("tests/**/Jam*")]
+    texts.append((root / "src" / "jamp" / "Jambase").read_text())
+    texts += [
+        '"a b" c a\\ b "a\\"b" \\" "" ;',
+        "# comment\nx # comment\n\n y#z\n# last",
+        "actions A {\n x { y } \n}\n B ;",
+        "actions A { x",
+        '"unmatched',
+        "include x ; x include y ; $(include) ;",
+        "x\\\ny\t\f\r\nz",
+    ]
+
+    for text in texts:
+        assert lexer_tokens(Lexer, text) == lexer_tokens(CharLexer, text)
+
+
+def test_parser_matches_ply(capsys):
+    from pathlib import Path
+
+    root = Path(__file__).parent.parent
+    texts = [p.read_text() for p in root.glob("tests/**/Jam*")]
+    texts.append((root / "src" / "jamp" / "Jambase").read_text())
+    texts += [
+        "if ! a = b || $(c) in d e && ( f < g ) != h { } else if x { } else { y ; }",
+        "while ! $(x) in && [ F x : y ] <= a | b & c >= d { break ; continue x ; }",
+        "local a ; local b = c d ; x on y default = 1 ; x ?= ; x += [ G ] ;",
+        "on x Echo y ; on x { Echo y ; } { } { a ; } Echo : : ; [ F ] ;",
+        "for x in a b { } switch $(x) { case *.c : a ; b ; case x : case y : }",
+        "return [ on x return $(y) ] [ on x R y : z ] ; include x ; x include y ;",
+        "actions updated maxline 10 together A bind X Y {\n echo $(<) { }\n}",
+        "rule R { } rule S { rule T { } }",
+    ]
+
+    for text in texts:
+        lexer = jam_syntax.Lexer()
+        lexer.input(text)
+        try:
+            ast = jam_syntax.Parser(lexer).parse()
+        except jam_syntax.ParseError:
+            # syntax errors are reported by PLY
+            jam_syntax.parse_ply(text)
+            assert "Syntax error" in capsys.readouterr().out
+            continue
+
+        assert str(ast) == str(jam_syntax.parse_ply(text))
+        assert capsys.readouterr().out == ""
+
+
+def test_parse_errors_are_reported_by_ply(capsys):
+    jam_syntax.parse("Echo a ;\nEcho on ;", filename="Jamfile")
+    assert capsys.readouterr().out == "Syntax error at ';' at line Jamfile:2\n"
@@ -2,8 +2,10 @@ import os
 import tempfile
 from os import sep as S
 
+from jamp.build import manifest_scope, ninja_build
 from jamp.classes import State, Target
-from jamp.executors import run
+from jamp.executors import bind_targets, run, select_roots
+from jamp.graph import TargetGraph
 
 
 def test_file_stat_cache(tmp_path, monkeypatch):
@@ -25,6 +27,82 @@ def test_file_stat_cache(tmp_path, monkeypatch):
     assert calls == 1
 
 
+def test_dir_index_search(tmp_path, monkeypatch):
+    dirs = [tmp_path / f"inc{i}" for i in range(10)]
+    for d in dirs:
+        d.mkdir()
+    (dirs[7] / "x.h").write_text("")
+    (dirs[8] / "x.h").write_text("")
+    (dirs[2] / "dangling.h").symlink_to(tmp_path / "missing.h")
+
+    state = State()
+    calls = 0
+    original_stat = os.stat
+
+    def count_stat(path, *args, **kwargs):
+        nonlocal calls
+        calls += 1
+        return original_stat(path, *args, **kwargs)
+
+    monkeypatch.setattr(os, "stat", count_stat)
+
+    state.vars.set("SEARCH", [str(d) for d in dirs] + ["/nonexistent"])
+    assert Target.bind(state, "x.h").search(state) == str(dirs[7] / "x.h")
+    assert Target.bind(state, "y.h").search(state) == "y.h"
+
+    # only the link is checked
+    assert calls == 1
+
+    assert state.dir_index.scans == 11
+    assert state.dir_index.dirs_by_name["x.h"] == {str(dirs[7]), str(dirs[8])}
+    assert not state.file_exists(str(dirs[2] / "dangling.h"))
+    assert state.file_exists(str(dirs[2]))
+
+
+def test_command_output_included(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    rules = """
+    if [ PathExists gen.jam ] { Exit ; }
+    x = [ Command "printf 'NotFile generated ;' > gen.jam" ] ;
+    include gen.jam ;
+    """
+
+    state = State()
+    run(state, state.parse_and_compile(rules))
+    assert "generated" in state.targets
+
+
+def test_prefetch_before_binding(tmp_path):
+    dirs = [tmp_path / f"inc{i}" for i in range(4)]
+    for d in dirs:
+        (d / "sub").mkdir(parents=True)
+    (dirs[2] / "x.h").write_text("")
+    (dirs[3] / "sub" / "y.h").write_text("")
+
+    state = State()
+    state.vars.set("SEARCH", [str(d) for d in dirs])
+    x = Target.bind(state, "x.h")
+    y = Target.bind(state, "sub/y.h")
+
+    bind_targets(state, search_headers="none", stat_jobs=4)
+    assert x.boundname == str(dirs[2] / "x.h")
+    assert y.boundname == str(dirs[3] / "sub" / "y.h")
+    assert all(str(d) in state.dir_index.entries for d in dirs)
+    assert all(str(d / "sub") in state.dir_index.entries for d in dirs)
+
+    # one job still prefetches
+    state = State()
+    state.vars.set("SEARCH", [str(d) for d in dirs])
+    Target.bind(state, "x.h")
+    bind_targets(state, search_headers="none", stat_jobs=1)
+    assert all(str(d) in state.dir_index.entries for d in dirs)
+
+    missing = str(tmp_path / "missing.h")
+    state.prefetch_stats([x.boundname, missing], 4)
+    assert state.file_stats[x.boundname] is not None
+    assert state.file_stats[missing] is None
+
+
 def test_global_locate_search():
     state = State()
     target = Target.bind(state, "test.c")
@@ -100,3 +178,97 @@ def test_linking_actions():
     state = State()
     run(state, state.parse_and_compile(rules))
     print(state.targets)
+
+
+def test_unreachable_targets():
+    rules = """
+    actions Cc { cc -c $(>) -o $(<) }
+
+    NotFile all install ;
+    Depends all : app ;
+    Depends app : main.o ;
+    Cc main.o : main.c ;
+    Depends install : /inst/app ;
+    Depends /inst/app : app ;
+    Cc orphan.o : orphan.c ;
+    """
+
+    def unreachable(roots):
+        state = State()
+        run(state, state.parse_and_compile(rules))
+        bind_targets(state, search_headers="none", roots=roots)
+        return {target.name for target in state.unreachable}
+
+    assert unreachable(None) == set()
+    assert unreachable([]) == {"orphan.o", "orphan.c"}
+    assert unreachable(["all"]) == {"orphan.o", "orphan.c", "install", "/inst/app"}
+    skipped = unreachable(["orphan.o"])
+    assert skipped == {"all", "app", "main.o", "main.c", "install", "/inst/app"}
+
+
+def test_partial_manifest(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    rules = """
+    actions Cc { cc -c $(>) -o $(<) }
+
+    NotFile all lib _gen_headers ;
+    Depends all : app gen/b.o lib/net/a.o c.o ;
+    Depends lib : lib/net/a.o ;
+    Cc app : main.c ;
+    Cc lib/net/a.o : lib/net/a.c ;
+    Cc gen/b.o : lib/net/b.c ;
+    SEARCH on c.c = lib/net ;
+    Cc c.o : c.c ;
+    """
+
+    state = State()
+    run(state, state.parse_and_compile(rules))
+
+    roots = select_roots(state, ["lib/net/"])
+    assert roots == ["lib/net/a.o", "gen/b.o", "c.o"]
+    assert select_roots(state, ["app"]) == ["app"]
+
+    # a pseudo-target and a directory with the same name
+    assert select_roots(state, ["lib"]) == ["lib"]
+    assert select_roots(state, ["lib/"]) == roots
+    (tmp_path / "lib").mkdir()
+    assert select_roots(state, ["lib"]) == roots
+
+    bind_targets(state, search_headers="none", roots=roots)
+    fn = tmp_path / "build.ninja"
+    with open(fn, "w") as f:
+        ninja_build(state, f, roots=roots, scope="lib/net/")
+
+    text = fn.read_text()
+    assert "main.c" not in text
+    assert text.endswith("default lib/net/a.o gen/b.o c.o\n")
+    assert manifest_scope(str(fn)) == "lib/net/"
+
+
+def test_target_graph():
+    rules = """
+    actions Cc { cc -c $(>) -o $(<) }
+
+    NotFile all ;
+    Depends all : main.o ;
+    Depends main.o : main.c ;
+    Cc main.o : main.c ;
+    Includes main.c : a.h ;
+    Includes a.h : b.h ;
+    Includes b.h : a.h ;
+    """
+
+    state = State()
+    run(state, state.parse_and_compile(rules))
+    bind_targets(state, search_headers="none")
+
+    graph = TargetGraph(state)
+    graph.remove_cycles([state.targets["all"]])
+    assert state.targets["b.h"].includes == set()
+
+    implicit, order_only = graph.dependencies(state.targets["main.o"].id)
+    assert graph.names(implicit) == ["main.c", "_a.h_"]
+    assert len(order_only) == 0
+
+    implicit, _ = graph.collection(state.targets["a.h"].id)
+    assert graph.names(implicit) == ["a.h", "b.h"]